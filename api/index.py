@@ -1,8 +1,55 @@
 from http.server import BaseHTTPRequestHandler
-from intraday import IntradayPriceManager
+from shared import SharedPriceManager
 import json
-from study import bind_result
+import os
+import time
+from cache import ResultCache
+from timeframes import bar_close_time, bar_open_time
+from study import bind_all, load_bindings
 from discord import Discord
+from metrics import REGISTRY
+
+SYMS = [
+    "BINANCE:BTCUSDT", "BINANCE:ETHUSDT", "BINANCE:DOTUSDT", "BINANCE:BNBUSDT", "BINANCE:CHZUSDT" 
+]
+INDICATORS = ["dbs"]
+TIMEFRAME = 240
+HISTBARS = 300
+
+# Warm for the lifetime of the process, shared by every request
+price_manager = SharedPriceManager()
+# Scan results only change when a bar closes, SCAN_CACHE_PATH keeps them across restarts
+result_cache = ResultCache(maxsize=32, path=os.environ.get("SCAN_CACHE_PATH"))
+# Plot titles of meta.json, read once
+bindings = load_bindings()
+# Delivers alerts in the background so the response does not wait on webhooks
+discord_client = Discord()
+
+def is_current(results):
+    """ Whether every symbol has every indicator calculated on the bar open now """
+    bar_time = bar_open_time(TIMEFRAME)
+    return len(results) == len(SYMS) and all(
+        len(studies) == len(INDICATORS) and all(
+            vals[0] == bar_time for vals in studies.values())
+        for studies in results.values())
+
+def scan():
+    """
+    Returns the scan response and whether it can be cached: right after a bar closes
+    or while reconnecting the results may still be those of the previous bar
+    """
+    started = time.perf_counter()
+    results = price_manager.get_technical_results(
+        syms=SYMS,
+        indicators=INDICATORS,
+        timeframe=TIMEFRAME,
+        histbars=HISTBARS)
+    response = bind_all(results, bindings)
+
+    discord_client.deliver(response, TIMEFRAME, bar_time=bar_close_time(TIMEFRAME))
+    if REGISTRY.enabled:
+        REGISTRY.observe("scan_seconds", time.perf_counter() - started)
+    return response, is_current(results)
 
 class handler(BaseHTTPRequestHandler):
 
@@ -10,31 +57,8 @@ class handler(BaseHTTPRequestHandler):
         self.send_response(200)
         self.send_header('Content-type','text/plain')
         self.end_headers()
-        ipm = IntradayPriceManager()
-
-        ipm.get(type="chart",
-            syms=[
-                "BINANCE:BTCUSDT", "BINANCE:ETHUSDT", "BINANCE:DOTUSDT", "BINANCE:BNBUSDT", "BINANCE:CHZUSDT" 
-            ],
-            indicators=["dbs"],
-            timeframe=240,
-            histbars=300)
-
-        results = ipm.get_technical_results()
-        f = open('meta.json')
-        response = {}
-        data = json.load(f)
-        for key, indicators in results.items():
-            for indicator, calculation in indicators.items():
-                if(data.get(indicator)):
-                    binded_result = bind_result(calculation[1:], data.get(indicator))
-                    if(len(binded_result) > 0):
-                        response[key] = {indicator: binded_result}
-
-        discord_client = Discord()
-        discord_data = discord_client.prepare_data(response, 240)
-
-        for d_data in discord_data:
-            discord_client.send_to_discord(d_data)
+        response, _ = result_cache.get(
+            (tuple(SYMS), tuple(INDICATORS), TIMEFRAME, HISTBARS), TIMEFRAME, scan,
+            cache_if=lambda result: result[1])
         self.wfile.write(json.dumps(response).encode())
-        return
\ No newline at end of file
+        return
@@ -0,0 +1,12 @@
+from http.server import BaseHTTPRequestHandler
+from metrics import REGISTRY
+
+class handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        """ Prometheus text format of the scans served by this process, see metrics.py """
+        self.send_response(200)
+        self.send_header('Content-type','text/plain; version=0.0.4')
+        self.end_headers()
+        self.wfile.write(REGISTRY.render().encode())
+        return
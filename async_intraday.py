@@ -0,0 +1,267 @@
+"""
+AsyncIntradayPriceManager is the asyncio counterpart of IntradayPriceManager. Chart
+subscriptions of any number of concurrent get calls are multiplexed over a small pool
+of websockets, each get being answered through its own future.
+
+    async with AsyncIntradayPriceManager() as ipm:
+        rsi, dbs = await asyncio.gather(
+            ipm.get("chart", syms=["BINANCE:ETHUSDT"], indicators=["rsi"]),
+            ipm.get("chart", syms=["BINANCE:BTCUSDT"], indicators=["dbs"], timeframe=60))
+"""
+
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+import websockets
+
+from frames import HEARTBEAT, FrameDecoder, batch, encode, parse
+from intraday import PHASES, IntradayPriceManager, count_frame
+from metrics import REGISTRY
+from stream import AsyncEventQueue
+
+
+def _origin(url):
+    """ Origin websocket-client sends by default, TradingView checks it """
+    parts = urlsplit(url)
+    return f'{"https" if parts.scheme == "wss" else "http"}://{parts.netloc}'
+
+
+class _Connection():
+    def __init__(self, owner, ws, handshake=None, exclusive=False):
+        self._owner = owner
+        self._ws = ws
+        # Seconds it took to open the websocket
+        self.handshake = handshake
+        # Holds the sessions of a single "block" stream, whose full queue may stop reading
+        self.exclusive = exclusive
+        self._decoder = FrameDecoder()
+        # chart session -> (IntradayPriceManager holding the request state, future)
+        self.sessions = {}
+        self._reader = asyncio.ensure_future(self._read())
+
+    async def send(self, msgs):
+        for msg in batch(msgs):
+            await self._ws.send(msg)
+
+    async def close(self):
+        # The reader drains the socket until the closing handshake completes
+        await self._ws.close()
+        self._reader.cancel()
+
+    async def _read(self):
+        try:
+            async for message in self._ws:
+                registry = REGISTRY if REGISTRY.enabled else None
+                if registry:
+                    started = time.perf_counter()
+                    registry.inc("messages_total")
+                    registry.inc("bytes_total", len(message))
+                for kind, payload in self._decoder.feed(message):
+                    if registry:
+                        count_frame(registry, kind)
+                    if kind == HEARTBEAT:
+                        await self._ws.send(encode(payload))
+                    elif kind in PHASES:
+                        params = parse(payload).get("p")
+                        request = self.sessions.get(params[0])
+                        if request:
+                            request[0]._on_phase(kind, params)
+                    elif kind == "du" or kind == "timescale_update":
+                        if kind == "du":
+                            ipm = self._on_data_update(parse(payload).get("p"))
+                        else:
+                            ipm = self._on_timescale_update(parse(payload).get("p"))
+                        if ipm is not None and ipm._results:
+                            ipm._notify()
+                        if ipm is not None and ipm._outbox:
+                            events, ipm._outbox = ipm._outbox, []
+                            for event in events:
+                                if ipm._events.closed:
+                                    break
+                                if self.exclusive:
+                                    # Awaited, a full "block" stream stops reading its socket
+                                    await ipm._events.put(event)
+                                else:
+                                    # Never awaited, the socket is shared with other requests
+                                    ipm._events.put_nowait(event)
+                if registry:
+                    registry.observe("message_seconds", time.perf_counter() - started)
+        except websockets.ConnectionClosed as err:
+            self._owner.on_error(self._ws, err)
+        finally:
+            self._owner._drop(self)
+
+    def _on_timescale_update(self, params):
+        request = self.sessions.get(params[0])
+        if request is None:
+            return
+        ipm, future = request
+        if ipm._on_timescale_update(params) and not future.done():
+            future.set_result(True)
+        return ipm
+
+    def _on_data_update(self, params):
+        request = self.sessions.get(params[0])
+        if request is None:
+            # Late update of a session whose request already returned
+            return
+        ipm, future = request
+        if ipm._on_data_update(params) and not future.done():
+            future.set_result(True)
+        return ipm
+
+
+class AsyncIntradayPriceManager():
+    """
+    Results live in the IntradayPriceManager of each request and are returned by get,
+    so there is no manager wide get_technical_results, wait or get_bars.
+    """
+    def __init__(self, debug=False, connections=2):
+        # Default syms, indicators... of a request, and the message encoder
+        self._defaults = IntradayPriceManager(debug=debug)
+        self._debug = debug
+        self._ws_url = self._defaults._ws_url
+        self._max_connections = connections
+        self._connections = []
+        # Connections of "block" streams
+        self._exclusive = set()
+        self._connecting = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def get(self, type: str = "chart", timeout=None, **kwargs):
+        """
+        Same kwargs as IntradayPriceManager.get, returns what get_technical_results
+        would. On timeout the studies calculated so far are returned.
+        """
+        if type != "chart":
+            raise Exception("Only chart sessions are supported")
+        ipm, msgs = self._request(**kwargs)
+        future = asyncio.get_running_loop().create_future()
+
+        connection = await self._subscribe(ipm, future)
+        try:
+            await connection.send(msgs)
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            await self._unsubscribe(connection, ipm)
+        return ipm.get_technical_results()
+
+    async def stream(self, maxsize=1024, policy="drop_oldest", **kwargs):
+        """
+        async for over the PriceEvent, BarEvent and StudyEvent of a live chart
+        subscription, same kwargs as get. Ends when the connection drops. A "block"
+        stream gets a connection of its own, so a slow consumer only holds back itself.
+        """
+        ipm, msgs = self._request(**kwargs)
+        events = AsyncEventQueue(maxsize, policy)
+        ipm._outbox = []
+        ipm._events = events
+        # Never resolved, a stream ends with its generator
+        future = asyncio.get_running_loop().create_future()
+
+        exclusive = None
+        if policy == "block":
+            exclusive = await self._open(exclusive=True)
+            self._exclusive.add(exclusive)
+        connection = await self._subscribe(ipm, future, exclusive)
+        try:
+            await connection.send(msgs)
+            while True:
+                event = await events.get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            events.close()
+            if exclusive is not None:
+                self._exclusive.discard(exclusive)
+                await exclusive.close()
+            else:
+                await self._unsubscribe(connection, ipm)
+
+    @staticmethod
+    def on_error(ws, error):
+        print(error)
+
+    def _request(self, **kwargs):
+        """ IntradayPriceManager holding the state of one request and its messages """
+        defaults = self._defaults
+        syms = kwargs.get("syms") or defaults._syms
+        timeframe = f'{kwargs.get("timeframe") or defaults._timeframe}'
+        indicators = kwargs.get("indicators") or defaults._indicators
+        histbars = kwargs.get("histbars") or defaults._histbars
+        local = kwargs.get("local_indicators", False)
+
+        # Every request gets its own state, the connection routes du packets to it
+        ipm = IntradayPriceManager(debug=self._debug)
+        ipm._on_result = kwargs.get("on_result")
+        return ipm, ipm._chart_messages(syms, timeframe, indicators, histbars, local,
+                                        kwargs.get("timeframes"))
+
+    async def _subscribe(self, ipm, future, connection=None):
+        """ Routes the sessions of ipm to future, by default on the least loaded connection """
+        if connection is None:
+            connection = await self._connection()
+        for c_session in ipm._state:
+            connection.sessions[c_session] = (ipm, future)
+        ipm._handshake = connection.handshake
+        ipm._mark_sent()
+        return connection
+
+    async def _unsubscribe(self, connection, ipm):
+        for c_session in ipm._state:
+            connection.sessions.pop(c_session, None)
+        if connection in self._connections:
+            await connection.send([
+                self._defaults._create_msg("chart_delete_session", [c_session])
+                for c_session in ipm._state
+            ])
+
+    async def close(self):
+        connections, self._connections = self._connections + list(self._exclusive), []
+        self._exclusive = set()
+        for connection in connections:
+            await connection.close()
+
+    async def _connection(self):
+        """ Least loaded connection, opening another one while the pool is not full """
+        if len(self._connections) < self._max_connections and self._connecting is None:
+            self._connecting = asyncio.ensure_future(self._connect())
+        if not self._connections:
+            await asyncio.shield(self._connecting)
+        return min(self._connections, key=lambda c: len(c.sessions))
+
+    async def _connect(self):
+        try:
+            self._connections.append(await self._open())
+        finally:
+            self._connecting = None
+
+    async def _open(self, exclusive=False):
+        """ New authenticated connection, outside of the pool """
+        started = time.perf_counter()
+        ws = await websockets.connect(self._ws_url, max_size=None, origin=_origin(self._ws_url))
+        handshake = time.perf_counter() - started
+        if REGISTRY.enabled:
+            REGISTRY.observe("phase_seconds", handshake, (("phase", "handshake"), ))
+        await ws.send(self._defaults._create_msg("set_auth_token",
+                                                 ["unauthorized_user_token"]))
+        return _Connection(self, ws, handshake, exclusive)
+
+    def _drop(self, connection):
+        if connection in self._connections:
+            self._connections.remove(connection)
+        self._exclusive.discard(connection)
+        for ipm, future in connection.sessions.values():
+            if ipm._events is not None:
+                ipm._events.close()
+            elif not future.done():
+                future.set_exception(ConnectionError("TradingView connection closed"))
@@ -0,0 +1,79 @@
+"""
+BarBuffer keeps the OHLCV bars of one series in preallocated columns of C doubles
+instead of nested dicts of Python floats, about 48 bytes per bar.
+"""
+
+from array import array
+from bisect import bisect_left
+
+FIELDS = ("time", "open", "high", "low", "close", "volume")
+
+
+class BarBuffer():
+    """
+    Holds the latest capacity bars, oldest first. Each column is allocated twice as
+    long as capacity so appending only moves data when the end is reached, at which
+    point the newest bars are shifted back to the front in place.
+    """
+    __slots__ = ("_capacity", "_columns", "_start", "_end")
+
+    def __init__(self, capacity: int = 300):
+        self._capacity = capacity
+        self._columns = tuple(array("d", bytes(16 * capacity)) for _ in FIELDS)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    def update(self, bar):
+        """ Merges a [time, open, high, low, close, volume] bar, volume is optional """
+        time = bar[0]
+        times = self._columns[0]
+        end = self._end
+        if end > self._start and time <= times[end - 1]:
+            # Update of the live bar, or a correction of an older one
+            if time == times[end - 1]:
+                i = end - 1
+            else:
+                i = bisect_left(times, time, self._start, end)
+                if times[i] != time:
+                    return
+        else:
+            if end == 2 * self._capacity:
+                self._compact()
+                end = self._end
+            i = end
+            self._end = end + 1
+            if self._end - self._start > self._capacity:
+                self._start += 1
+        for column, value in zip(self._columns, bar):
+            column[i] = value
+        if len(bar) < 6:
+            self._columns[5][i] = 0.0
+
+    def extend(self, bars):
+        for bar in bars:
+            self.update(bar)
+
+    def column(self, field: str) -> memoryview:
+        """
+        Zero-copy view of one column, oldest first. The view follows in-place updates
+        of the live bar, copy it (e.g. with .tolist()) for a stable snapshot.
+        """
+        column = self._columns[FIELDS.index(field)]
+        return memoryview(column)[self._start:self._end]
+
+    def last(self):
+        """ Latest bar as a tuple in FIELDS order, None while empty """
+        if self._end == self._start:
+            return None
+        i = self._end - 1
+        return tuple(column[i] for column in self._columns)
+
+    def _compact(self):
+        keep = self._end - self._start
+        for column in self._columns:
+            column[0:keep] = column[self._start:self._end]
+        self._start = 0
+        self._end = keep
@@ -0,0 +1,298 @@
+"""
+Benchmarks for the hot paths of IntradayPriceManager. The end-to-end ones run against a
+local replay.ReplayServer, synthetic by default or replaying a recording made with
+replay.Recorder, whose inbound messages then also feed the parser benchmark.
+
+    python benchmark.py [recording.jsonl]
+"""
+
+import json
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
+import websocket
+
+from bars import BarBuffer
+from frames import HEARTBEAT, FrameDecoder, batch, encode, parse
+from indicators import RSI
+from intraday import IntradayPriceManager
+from metrics import REGISTRY
+from replay import ReplayServer, load
+from scanner import ScanCoordinator
+from store import BarStore
+
+
+def du_burst(sessions=500, messages=20000, frames_per_message=4):
+    """ Websocket messages shaped like the du flood of a large chart subscription """
+    burst = []
+    t = 1620000000
+    for n in range(messages):
+        frames = []
+        for _ in range(frames_per_message):
+            i = random.randrange(sessions)
+            if random.random() < 0.5:
+                update = {f"s_{i}": {"s": [{"i": 299, "v": [
+                    t, 1.5, 1.7, 1.4, round(random.uniform(1.4, 1.7), 4), 1234.5
+                ]}], "ns": {"d": "", "indexes": []}, "t": f"s_{i}", "lbs": {"bar_close_time": t + 14400}}}
+            else:
+                update = {f"dbs_{i}": {"st": [{"i": 299, "v": [
+                    t, *[random.choice([0, 1e100, round(random.random(), 4)]) for _ in range(21)]
+                ]}], "ns": {"d": "", "indexes": "nochange"}, "t": f"s_{i}"}}
+            frames.append(encode(json.dumps({"m": "du", "p": [f"cs_{i:012d}", update]}, separators=(",", ":"))))
+        if n % 50 == 0:
+            burst.append(encode(f"{HEARTBEAT}{n}"))
+        burst.append("".join(frames))
+    return burst
+
+
+def legacy_parse(burst):
+    """ The regex based parser that on_message used before FrameDecoder """
+    packets = 0
+    for message in burst:
+        pattern = re.compile(r'~m~\d+~m~~h~\d+$')
+        if pattern.match(message):
+            continue
+        msg_body = re.compile(r'~m~\d+~m~')
+        for msg in msg_body.split(message):
+            if msg:
+                parsed_msg = json.loads(msg)
+                if parsed_msg.get("m") == "du":
+                    packets += 1
+    return packets
+
+
+def decoder_parse(burst):
+    packets = 0
+    decoder = FrameDecoder()
+    for message in burst:
+        for kind, payload in decoder.feed(message):
+            if kind == "du":
+                parse(payload)
+                packets += 1
+    return packets
+
+
+def bench_parser(burst):
+    for name, parse in (("legacy", legacy_parse), ("decoder", decoder_parse)):
+        started = time.perf_counter()
+        packets = parse(burst)
+        elapsed = time.perf_counter() - started
+        print(f"parser {name:8} {len(burst) / elapsed:12,.0f} messages/sec "
+              f"{packets / elapsed:12,.0f} du/sec")
+
+
+def random_walk(bars=300, start=1620000000, timeframe=14400):
+    close = 100.0
+    for i in range(bars):
+        close += random.uniform(-1, 1)
+        yield [start + i * timeframe, close, close + 1, close - 1, close, 1000.0]
+
+
+def bench_local_rsi(symbols, histbars=300, updates=5):
+    """ Seeding RSI from history, then updates of the live bar, across symbols """
+    buffers = []
+    for _ in range(symbols):
+        bars = BarBuffer(histbars)
+        bars.extend(random_walk(histbars))
+        buffers.append((bars, RSI()))
+
+    started = time.perf_counter()
+    for bars, rsi in buffers:
+        rsi.update(bars)
+    seeded = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for n in range(updates):
+        for bars, rsi in buffers:
+            last = list(bars.last())
+            last[4] += 0.1
+            bars.update(last)
+            rsi.update(bars)
+    elapsed = time.perf_counter() - started
+    print(f"local rsi {symbols:6} symbols seed {seeded * 1000:8.1f} ms "
+          f"{symbols * updates / elapsed:12,.0f} updates/sec")
+
+
+def check_rsi_parity(bars=1000, ticks=3):
+    """ The incremental RSI must match a full recomputation of the closed bars """
+    buffer, rsi, closes, live = BarBuffer(300), RSI(), [], []
+    for bar in random_walk(bars):
+        for _ in range(ticks):
+            bar[4] += random.uniform(-0.5, 0.5)
+            buffer.update(bar)
+            vals = rsi.update(buffer)
+        closes.append(bar[4])
+        live.append(vals[1] if vals else float("nan"))
+    reference = RSI().compute(closes)
+    error = max(abs(a - b) for a, b in zip(live[15:], reference[15:]))
+    print(f"local rsi parity max abs error {error:.2e}")
+
+
+def recorded_burst(path, messages=20000):
+    """ Inbound messages of a recording, repeated up to messages """
+    recorded = [m for _, direction, m in load(path) if direction == "in"]
+    return (recorded * (messages // len(recorded) + 1))[:messages]
+
+
+def bench_first_update(url, runs=5):
+    """ Seconds from get() to the first calculated study """
+    latencies = []
+    for _ in range(runs):
+        ipm = IntradayPriceManager()
+        ipm._ws_url = url
+        started = time.perf_counter()
+        first = []
+        ipm.get(type="chart", syms=["BINANCE:ETHUSDT"], indicators=["dbs"],
+                timeframe=240, timeout=10,
+                on_result=lambda *_: first or first.append(time.perf_counter()))
+        latencies.append(first[0] - started if first else float("nan"))
+    latencies.sort()
+    print(f"first update median {latencies[len(latencies) // 2] * 1000:8.1f} ms "
+          f"max {latencies[-1] * 1000:8.1f} ms")
+
+
+def bench_scan(url, symbols, indicators=("dbs", )):
+    ipm = IntradayPriceManager()
+    ipm._ws_url = url
+    syms = [f"BINANCE:SYM{i}USDT" for i in range(symbols)]
+    started = time.perf_counter()
+    ipm.get(type="chart", syms=syms, indicators=list(indicators), timeframe=240,
+            timeout=60)
+    elapsed = time.perf_counter() - started
+    calculated = sum(len(v) for v in ipm.get_technical_results().values())
+    print(f"scan {symbols:6} symbols {elapsed * 1000:10.1f} ms "
+          f"{calculated}/{symbols * len(indicators)} studies")
+
+
+def legacy_chart_messages(ipm, syms, timeframe, indicators, histbars):
+    """ Subscription messages as on_open built them before the study payloads were precompiled """
+    msgs = []
+    for i, sym in enumerate(syms):
+        c_session = ipm._gen_session(type="chart")
+        msgs.append(ipm._create_msg("chart_create_session", [c_session, ""]))
+        msgs.append(ipm._create_msg("switch_timezone", [c_session, "Asia/Singapore"]))
+        msgs.append(ipm._create_msg("resolve_symbol", [
+            c_session, f"symbol_{i}", ipm._add_chart_symbol(sym)]))
+        msgs.append(ipm._create_msg("create_series", [
+            c_session, f"s_{i}", f"s_{i}", f"symbol_{i}", timeframe, histbars]))
+        for indicator in indicators:
+            msgs.append(ipm._create_msg("create_study", [
+                c_session, f"{indicator}_{i}", f"{indicator}_{i}", f"s_{i}",
+                "Script@tv-scripting-101!", ipm._indicator_mapper(indicator)]))
+    return msgs
+
+
+def _drain(ws):
+    try:
+        while ws.recv():
+            pass
+    except websocket.WebSocketException:
+        pass
+
+
+def bench_subscribe(url, symbols, indicators=("dbs", "rsi"), histbars=10):
+    """ Building and writing the subscription of a universe, one frame per write vs batched """
+    syms = [f"BINANCE:SYM{i}USDT" for i in range(symbols)]
+    for name in ("legacy", "batched"):
+        ipm = IntradayPriceManager()
+        ws = websocket.create_connection(url, skip_utf8_validation=True)
+        # The replies are not measured but have to be read, or the server stops reading too
+        reader = threading.Thread(target=_drain, args=(ws, ))
+        reader.daemon = True
+        reader.start()
+        started = time.perf_counter()
+        if name == "legacy":
+            msgs = legacy_chart_messages(ipm, syms, "240", list(indicators), histbars)
+        else:
+            msgs = batch(ipm._chart_messages(syms, "240", list(indicators), histbars))
+        built = time.perf_counter() - started
+        for msg in msgs:
+            ws.send(msg)
+        elapsed = time.perf_counter() - started
+        ws.close()
+        print(f"subscribe {name:8} {symbols:6} symbols build {built * 1000:8.1f} ms "
+              f"total {elapsed * 1000:8.1f} ms {len(msgs):6} writes")
+
+
+def bench_sharded(url, symbols, shards, processes=True, indicators=("dbs", )):
+    """ The scan of bench_scan split over shards connections / worker processes """
+    syms = [f"BINANCE:SYM{i}USDT" for i in range(symbols)]
+    with ScanCoordinator(shards, processes=processes, ws_url=url) as coordinator:
+        started = time.perf_counter()
+        results = coordinator.get_technical_results(syms, list(indicators), timeframe=240)
+        elapsed = time.perf_counter() - started
+    calculated = sum(len(v) for v in results.values())
+    print(f"sharded scan {symbols:6} symbols {shards:3} shards {elapsed * 1000:10.1f} ms "
+          f"{calculated}/{symbols * len(indicators)} studies")
+
+
+def bench_store(url, symbols, histbars=300):
+    """ A local RSI scan with an empty BarStore, then again with the bars it stored """
+    syms = [f"BINANCE:SYM{i}USDT" for i in range(symbols)]
+    enabled = REGISTRY.enabled
+    REGISTRY.enabled = True
+    with tempfile.TemporaryDirectory() as path:
+        for name in ("cold", "warm"):
+            REGISTRY.reset()
+            store = BarStore(path)
+            ipm = IntradayPriceManager(store=store)
+            ipm._ws_url = url
+            started = time.perf_counter()
+            ipm.get(type="chart", syms=syms, indicators=["rsi"], local_indicators=True,
+                    timeframe=1, histbars=histbars, timeout=60)
+            elapsed = time.perf_counter() - started
+            received = REGISTRY._counters.get(("bytes_total", ()), 0)
+            store.close()
+            print(f"store {name:5} {symbols:6} symbols {elapsed * 1000:10.1f} ms "
+                  f"{received / 1e6:8.2f} MB received")
+    REGISTRY.reset()
+    REGISTRY.enabled = enabled
+
+
+def bench_timeframes(url, symbols, timeframes=(15, 60, 240, "1D"), histbars=100):
+    """ Local RSI on several timeframes, one chart get per timeframe vs one resampled get """
+    syms = [f"BINANCE:SYM{i}USDT" for i in range(symbols)]
+    enabled = REGISTRY.enabled
+    REGISTRY.enabled = True
+    for name in ("separate", "resampled"):
+        REGISTRY.reset()
+        started = time.perf_counter()
+        calculated = sessions = 0
+        for timeframe in (timeframes if name == "separate" else [None]):
+            ipm = IntradayPriceManager()
+            ipm._ws_url = url
+            kwargs = {"timeframe": timeframe} if timeframe else {"timeframes": list(timeframes)}
+            ipm.get(type="chart", syms=syms, indicators=["rsi"], local_indicators=True,
+                    histbars=histbars, timeout=60, **kwargs)
+            calculated += sum(len(v) for v in ipm.get_technical_results().values())
+            sessions += len(ipm._state)
+        elapsed = time.perf_counter() - started
+        received = REGISTRY._counters.get(("bytes_total", ()), 0)
+        print(f"timeframes {name:9} {symbols:6} symbols {sessions:6} sessions "
+              f"{elapsed * 1000:10.1f} ms {received / 1e6:8.2f} MB received "
+              f"{calculated}/{symbols * len(timeframes)} studies")
+    REGISTRY.reset()
+    REGISTRY.enabled = enabled
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    recording = sys.argv[1] if len(sys.argv) > 1 else None
+    bench_parser(recorded_burst(recording) if recording else du_burst())
+    check_rsi_parity()
+    for symbols in (100, 1000, 5000):
+        bench_local_rsi(symbols)
+    with ReplayServer(recording, speed=None) as server:
+        bench_first_update(server.url)
+        for symbols in (500, 2000):
+            bench_subscribe(server.url, symbols)
+        for symbols in (10, 100, 500):
+            bench_scan(server.url, symbols)
+        for shards in (1, 2, 4):
+            bench_sharded(server.url, 500, shards)
+        bench_store(server.url, 500)
+        bench_timeframes(server.url, 100, timeframes=(15, 60, 240))
@@ -0,0 +1,109 @@
+"""
+ResultCache keeps scan results until the bar they were computed on closes. Results of a
+240 minute timeframe scan cannot change before the next 4h bar, so every request in
+between is answered from memory, or from disk after a restart within the same bar.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from timeframes import bar_close_time
+
+
+class _Flight():
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResultCache():
+    def __init__(self, maxsize: int = 128, path: str = None):
+        self._maxsize = maxsize
+        self._path = path
+        self._lock = threading.Lock()
+        # key -> (expires, value), least recently used first
+        self._entries = OrderedDict()
+        self._flights = {}
+        if path:
+            self._load()
+
+    def get(self, key, timeframe, fetch, cache_if=None):
+        """
+        Cached value of key, or the result of fetch() cached until the current bar of
+        timeframe closes. Concurrent misses on the same key share a single fetch().
+        cache_if(value) can keep a value, e.g. a partial result, out of the cache.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.time():
+                self._entries.move_to_end(key)
+                return entry[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = fetch()
+        except Exception as err:
+            flight.error = err
+            raise
+        else:
+            if cache_if is None or cache_if(flight.value):
+                self.set(key, timeframe, flight.value)
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.value
+
+    def set(self, key, timeframe, value):
+        with self._lock:
+            self._entries[key] = (bar_close_time(timeframe), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+            if self._path:
+                self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._path:
+                self._save()
+
+    def _load(self):
+        try:
+            with open(self._path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, expires, value in entries:
+            if expires > now:
+                self._entries[self._key(key)] = (expires, value)
+
+    def _save(self):
+        # Written to a temporary file first so a crash never leaves a torn cache
+        tmp = f"{self._path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump([[key, expires, value]
+                       for key, (expires, value) in self._entries.items()], f)
+        os.replace(tmp, self._path)
+
+    @classmethod
+    def _key(cls, key):
+        """ JSON turns the tuples of a key into lists, turn them back """
+        if isinstance(key, list):
+            return tuple(cls._key(k) for k in key)
+        return key
@@ -0,0 +1,15 @@
+"""
+Shared pytest fixtures. Tests run against the local stand-ins of replay.py instead of
+TradingView, this file also puts the top-level modules on sys.path.
+"""
+
+import pytest
+
+from replay import ReplayServer
+
+
+@pytest.fixture
+def replay_server():
+    """ ReplayServer of synthetic bars, answering as fast as possible """
+    with ReplayServer(speed=None, tick_interval=0.01) as server:
+        yield server
@@ -1,19 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import requests #dependency
 
+# Discord webhook limits, https://discord.com/developers/docs/resources/message#embed-object-embed-limits
+MAX_EMBEDS = 10
+MAX_EMBED_CHARS = 6000
+MAX_FIELDS = 25
+
+
 class Discord():
-    def __init__(self):
-        self._webhook_url = ""
-    
+    def __init__(self, webhook_url="", workers=4, retries=5):
+        self._webhook_url = webhook_url
+        # One pooled session for every webhook call instead of a new connection each
+        self._session = requests.Session()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._retries = retries
+        self._lock = threading.Lock()
+        # Epoch seconds before which the webhook bucket is exhausted
+        self._blocked_until = 0
+        # (symbol, tf, indicator, plot, bar_time) already delivered, oldest first
+        self._sent = OrderedDict()
+        self._max_sent = 4096
+
     def send_to_discord(self, data):
-        print(data)
-        result = requests.post(self._webhook_url, json = data)
-        try:
-            result.raise_for_status()
-        except requests.exceptions.HTTPError as err:
-            print(err)
-        else:
-            print("Payload delivered successfully, code {}.".format(result.status_code))
-    
+        """ Posts one webhook payload, waiting out rate limits, returns True once delivered """
+        for _ in range(self._retries):
+            self._wait_for_bucket()
+            try:
+                result = self._session.post(self._webhook_url, json=data, timeout=10)
+            except requests.exceptions.RequestException as err:
+                print(err)
+                return False
+            self._update_bucket(result)
+            if result.status_code == 429:
+                # The bucket was exhausted by someone else, retry after the reset
+                continue
+            try:
+                result.raise_for_status()
+            except requests.exceptions.HTTPError as err:
+                print(err)
+                return False
+            else:
+                print("Payload delivered successfully, code {}.".format(result.status_code))
+                return True
+        print("Payload dropped, still rate limited after {} attempts.".format(self._retries))
+        return False
+
+    def deliver(self, data, tf, bar_time=None):
+        """
+        Sends the signals of data ({symbol: {indicator: fields}}) in the background,
+        packing several symbols into as few webhook calls as the limits allow. Plots
+        already sent for the same bar_time are skipped. Returns the futures of the calls.
+        """
+        embeds, keys = [], []
+        with self._lock:
+            for symbol, indicators in data.items():
+                for indicator, value in indicators.items():
+                    fields = []
+                    for field in value:
+                        # Per plot, not per value, so a live bar moving a plot sends it once
+                        key = (symbol, tf, indicator, field["name"], bar_time)
+                        if key in self._sent:
+                            continue
+                        self._sent[key] = True
+                        if len(self._sent) > self._max_sent:
+                            self._sent.popitem(last=False)
+                        fields.append((key, field))
+                    for i in range(0, len(fields), MAX_FIELDS):
+                        embeds.append({
+                            "title": f"{symbol}{tf} {indicator}",
+                            "fields": [field for _, field in fields[i:i + MAX_FIELDS]]
+                        })
+                        keys.append([key for key, _ in fields[i:i + MAX_FIELDS]])
+        futures = []
+        start = 0
+        for payload in self.batch(embeds, tf):
+            stop = start + len(payload["embeds"])
+            sent = {key for embed_keys in keys[start:stop] for key in embed_keys}
+            futures.append(self._executor.submit(self._send_batch, payload, sent))
+            start = stop
+        return futures
+
+    def batch(self, embeds, tf):
+        """ Packs embeds into webhook payloads of at most MAX_EMBEDS / MAX_EMBED_CHARS """
+        payloads = []
+        current, chars = [], 0
+        for embed in embeds:
+            size = self._embed_chars(embed)
+            if current and (len(current) == MAX_EMBEDS or chars + size > MAX_EMBED_CHARS):
+                payloads.append({"username": f"Scanner {tf}", "embeds": current})
+                current, chars = [], 0
+            current.append(embed)
+            chars += size
+        if current:
+            payloads.append({"username": f"Scanner {tf}", "embeds": current})
+        return payloads
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._session.close()
+
     def prepare_data(self, data, tf):
         discord_data = []
         for symbol, indicators in data.items():
@@ -27,3 +116,38 @@ class Discord():
                 })
             discord_data.append(webhook_data)
         return discord_data
+
+    def _send_batch(self, payload, keys):
+        delivered = self.send_to_discord(payload)
+        if not delivered:
+            # Let the next scan try these signals again
+            with self._lock:
+                for key in keys:
+                    self._sent.pop(key, None)
+        return delivered
+
+    def _wait_for_bucket(self):
+        with self._lock:
+            delay = self._blocked_until - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _update_bucket(self, result):
+        """ Honors X-RateLimit-* headers and the retry_after of a 429 """
+        headers = result.headers
+        delay = 0
+        if result.status_code == 429:
+            try:
+                delay = float(result.json().get("retry_after", 1))
+            except ValueError:
+                delay = float(headers.get("Retry-After", 1))
+        elif headers.get("X-RateLimit-Remaining") == "0":
+            delay = float(headers.get("X-RateLimit-Reset-After", 0))
+        if delay > 0:
+            with self._lock:
+                self._blocked_until = max(self._blocked_until, time.time() + delay)
+
+    @staticmethod
+    def _embed_chars(embed):
+        return len(embed["title"]) + sum(
+            len(field["name"]) + len(field["value"]) for field in embed["fields"])
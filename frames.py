@@ -0,0 +1,135 @@
+"""
+Incremental decoder for the TradingView socket wire format.
+
+Every websocket message is a concatenation of ~m~<len>~m~<payload> frames. A payload is
+either a JSON packet such as {"m":"du","p":[...]} or a heartbeat ~h~<n> that must be
+echoed back to keep the connection alive. Frames are read by their length prefix, so a
+frame split across websocket messages is buffered until the rest of it arrives.
+"""
+
+import json
+
+HEADER = "~m~"
+HEARTBEAT = "~h~"
+
+_TYPE_PREFIX = '{"m":"'
+_raw_decode = json.JSONDecoder().raw_decode
+
+
+def parse(payload: str):
+    """ json.loads for a single framed packet, minus the trailing data checks """
+    return _raw_decode(payload)[0]
+
+
+def message_type(payload: str):
+    """ Packet type ("du", "timescale_update", ...) without running json.loads """
+    if payload.startswith(_TYPE_PREFIX):
+        return payload[6:payload.find('"', 6)]
+    if payload.startswith("{"):
+        # Not in the server's compact form, fall back to a full parse
+        return json.loads(payload).get("m")
+    return None
+
+
+class FrameDecoder():
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, data: str) -> list:
+        """
+        Returns a list of (type, payload) tuples for every complete frame in data.
+        Heartbeats are reported with type HEARTBEAT and the raw ~h~<n> payload, packets
+        with their "m" value (None for packets without one, e.g. the session hello).
+        """
+        buf = self._buffer + data if self._buffer else data
+        # The server counts UTF-16 code units, which only differs from len() when the
+        # data holds characters outside the BMP. isascii() is O(1) on CPython.
+        astral = not buf.isascii() and max(buf) > "\uffff"
+        if not self._buffer and not astral:
+            frames = self._split(data)
+            if frames is not None:
+                return frames
+        end = len(buf)
+        pos = 0
+        frames = []
+        while pos < end:
+            if not buf.startswith(HEADER, pos):
+                if end - pos < 3 and HEADER.startswith(buf[pos:]):
+                    break
+                raise ValueError(f"Malformed frame at offset {pos}: {buf[pos:pos + 32]!r}")
+            sep = buf.find(HEADER, pos + 3)
+            if sep == -1:
+                break
+            start = sep + 3
+            size = int(buf[pos + 3:sep])
+            stop = self._utf16_stop(buf, start, size) if astral else start + size
+            if stop > end:
+                break
+            payload = buf[start:stop]
+            if payload.startswith(HEARTBEAT):
+                frames.append((HEARTBEAT, payload))
+            else:
+                frames.append((message_type(payload), payload))
+            pos = stop
+        self._buffer = buf[pos:]
+        return frames
+
+    @staticmethod
+    def _split(data: str):
+        """
+        Fast path for the common case of a message that ends on a frame boundary and
+        carries no ~m~ inside its payloads. Returns None whenever the lengths disagree.
+        """
+        parts = data.split(HEADER)
+        if parts[0] or not len(parts) & 1:
+            return None
+        frames = []
+        for i in range(2, len(parts), 2):
+            payload = parts[i]
+            size = parts[i - 1]
+            if not size.isdigit() or len(payload) != int(size):
+                return None
+            if payload.startswith(HEARTBEAT):
+                frames.append((HEARTBEAT, payload))
+            else:
+                frames.append((message_type(payload), payload))
+        return frames
+
+    def reset(self):
+        self._buffer = ""
+
+    @staticmethod
+    def _utf16_stop(buf: str, start: int, size: int) -> int:
+        """ Offset where a payload of size UTF-16 code units ends, past len(buf) if cut """
+        end = len(buf)
+        units = 0
+        pos = start
+        while units < size:
+            if pos == end:
+                return end + size - units
+            units += 2 if ord(buf[pos]) > 0xFFFF else 1
+            pos += 1
+        return pos
+
+
+def encode(payload: str) -> str:
+    return f'{HEADER}{len(payload)}{HEADER}{payload}'
+
+
+def batch(frames, limit: int = 65536) -> list:
+    """
+    Joins encoded frames into websocket messages of at most limit characters, the
+    server reads every frame of a message like it sends several per message itself.
+    A frame longer than limit goes out alone.
+    """
+    messages = []
+    current, size = [], 0
+    for frame in frames:
+        if current and size + len(frame) > limit:
+            messages.append("".join(current))
+            current, size = [], 0
+        current.append(frame)
+        size += len(frame)
+    if current:
+        messages.append("".join(current))
+    return messages
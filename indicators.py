@@ -0,0 +1,120 @@
+"""
+Local indicator engine. Standard studies listed in LOCAL_STUDIES are computed from the
+symbol's BarBuffer instead of asking the server for one more create_study per symbol,
+so an N symbol scan only needs N series subscriptions.
+
+Each study keeps its running state as of the last closed bar and recomputes only the
+live bar on every du, so an update costs O(1) whatever the history length.
+"""
+
+from array import array
+
+
+class RSI():
+    """ Same values as STD;RSI with its defaults: length 14, close source, Wilder's RMA """
+    __slots__ = ("_length", "_time", "_close", "_up", "_down")
+
+    def __init__(self, length: int = 14):
+        self._length = length
+        # State as of the last closed bar
+        self._time = None
+        self._close = None
+        self._up = None
+        self._down = None
+
+    @property
+    def min_bars(self) -> int:
+        """ Bars update needs before it returns a value """
+        return self._length + 2
+
+    def compute(self, closes) -> array:
+        """ RSI of every bar in closes, NaN until length changes are available """
+        length = self._length
+        values = array("d", [float("nan")]) * len(closes)
+        if len(closes) <= length:
+            return values
+        up = down = 0.0
+        for i in range(1, length + 1):
+            change = closes[i] - closes[i - 1]
+            if change > 0:
+                up += change
+            else:
+                down -= change
+        up /= length
+        down /= length
+        values[length] = self._rsi(up, down)
+        for i in range(length + 1, len(closes)):
+            change = closes[i] - closes[i - 1]
+            up = (up * (length - 1) + (change if change > 0 else 0.0)) / length
+            down = (down * (length - 1) + (-change if change < 0 else 0.0)) / length
+            values[i] = self._rsi(up, down)
+        return values
+
+    def update(self, bars):
+        """ [time, rsi] of the live bar of a BarBuffer, None while history is too short """
+        n = len(bars)
+        if n <= self._length + 1:
+            return None
+        times = bars.column("time")
+        closes = bars.column("close")
+        closed = times[n - 2]
+        if self._time != closed:
+            i = self._index(times, n)
+            if i is None:
+                self._seed(closes, n - 1)
+            else:
+                for j in range(i + 1, n - 1):
+                    self._commit(closes[j] - closes[j - 1])
+                self._close = closes[n - 2]
+            self._time = closed
+        change = closes[n - 1] - self._close
+        length = self._length
+        up = (self._up * (length - 1) + (change if change > 0 else 0.0)) / length
+        down = (self._down * (length - 1) + (-change if change < 0 else 0.0)) / length
+        return [times[n - 1], self._rsi(up, down)]
+
+    def _index(self, times, n):
+        """ Index of the last committed bar if it is still in the buffer """
+        if self._time is None:
+            return None
+        for i in range(n - 2, -1, -1):
+            if times[i] == self._time:
+                return i
+            if times[i] < self._time:
+                break
+        return None
+
+    def _seed(self, closes, n):
+        """ Rebuilds the state from the first n bars of closes """
+        length = self._length
+        up = down = 0.0
+        for i in range(1, length + 1):
+            change = closes[i] - closes[i - 1]
+            if change > 0:
+                up += change
+            else:
+                down -= change
+        self._up = up / length
+        self._down = down / length
+        for i in range(length + 1, n):
+            self._commit(closes[i] - closes[i - 1])
+        self._close = closes[n - 1]
+
+    def _commit(self, change):
+        length = self._length
+        self._up = (self._up * (length - 1) + (change if change > 0 else 0.0)) / length
+        self._down = (self._down * (length - 1) + (-change if change < 0 else 0.0)) / length
+
+    @staticmethod
+    def _rsi(up, down):
+        if down == 0:
+            return 100.0
+        if up == 0:
+            return 0.0
+        return 100 - 100 / (1 + up / down)
+
+
+# Indicators of IntradayPriceManager._indicator_mapper that can be computed locally
+LOCAL_STUDIES = {
+    "rsi": RSI,
+}
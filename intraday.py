@@ -3,28 +3,90 @@ IntradayPriceManager connects to TradingView and stores indicators and price ser
 in memory dictionary self._alerts.
 """
 
-import datetime
+import concurrent.futures
 import json
 import random
-import re
 import string
 import time
 import threading
 import websocket
 
+from bars import FIELDS, BarBuffer
+from frames import HEARTBEAT, FrameDecoder, batch, encode, parse
+from indicators import LOCAL_STUDIES
+from metrics import REGISTRY
+from quotes import QuoteTable
+from resample import Resampler
+from stream import BarEvent, EventQueue, PriceEvent, StudyEvent
+from timeframes import TIMEZONE, bar_open_time, timeframe_minutes
+
+# Most bars a single create_series is asked for
+MAX_HISTBARS = 5000
+
+# Server packets ending a phase of a chart session, timed from its first message
+PHASES = {
+    "symbol_resolved": "resolve_symbol",
+    "series_completed": "series",
+    "study_completed": "study"
+}
+
+def count_frame(registry, kind):
+    if kind == HEARTBEAT:
+        registry.inc("heartbeats_total")
+    else:
+        registry.inc("frames_total", labels=(("m", kind or "unknown"), ))
+
+
 class IntradayPriceManager():
-    def __init__(self, debug=False):
+    # indicator -> serialized _indicator_mapper payload, shared by every instance
+    _study_payloads = {}
+
+    def __init__(self, debug=False, keep_alive=False, recorder=None, reconnect=False,
+                 backoff=0.5, max_backoff=30, store=None):
         self._alerts = {
             "indicators": {},
             "price": {}
         }  
         self._debug = debug
+        # keep_alive leaves the socket open after every study is calculated so
+        # self._alerts keeps following the live updates
+        self._keep_alive = keep_alive
+        # replay.Recorder capturing the raw frames of every connection
+        self._recorder = recorder
+        # reconnect reopens a dropped socket after a jittered exponential backoff of
+        # up to max_backoff seconds and resubscribes the sessions of self._state
+        self._reconnect = reconnect
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._attempt = 0
+        self._resubscribe = False
+        self._dropped_at = None
+        # store.BarStore the closed bars are persisted to and history is preloaded from
+        self._store = store
+        # Set by close(), ends get instead of reconnecting
+        self._closing = threading.Event()
+        self._completed = threading.Event()
+        self._lock = threading.Lock()
         self._histbars = 300
         self._indicators = []
-        self._study_completed = {}
-        self._current_calculated_study_number = 0
+        # (sym, indicator) -> Future resolved with the study values of the current bar
+        self._futures = {}
+        self._pending = 0
+        self._on_result = None
+        # (sym, indicator, vals) of the packet being handled, for on_result
+        self._results = []
+        # While streaming, events of the packet being handled and the queue they go to
+        self._outbox = None
+        self._events = None
         self._state = {}
+        self._bars = {}
+        # QuoteTable of the quote session
+        self._quotes = None
         self._ws = None
+        # Seconds between run_forever and on_open of the current connection
+        self._handshake = None
+        self._connect_started = None
+        self._decoder = FrameDecoder()
         self._syms = [
             "BINANCE:UNIUSD", "BINANCE:ETHUSD", "BINANCE:DOTUSD", "SGX:ES3",
             "SGX:CLR"
@@ -41,90 +103,410 @@ class IntradayPriceManager():
             indicators: list of indicators, e.g. [rsi]
             timeframe: int of minutes of chart time frame, e.g. 240 -> 4 hours chart
             histbars: int of number of historical data points, e.g. 300
+            local_indicators: bool, compute the indicators in LOCAL_STUDIES from the
+                series instead of creating a server side study per symbol
+            timeout: float of seconds after which the socket is closed, leaving the
+                studies calculated so far in get_technical_results
+            on_result: callable(sym, indicator, vals) called as soon as a study of
+                the current bar is calculated, once the packet holding it is handled
+            timeframes: list of timeframes to watch instead of timeframe, e.g.
+                [15, 60, 240, "1D"]. Each symbol is subscribed once at the finest one and
+                its bars are resampled into the others, whose indicators are then
+                calculated locally (only those in LOCAL_STUDIES). Studies are stored
+                as indicator@timeframe, e.g. rsi@240. The finest timeframe is asked
+                for histbars bars of the coarsest but at most MAX_HISTBARS, so coarse
+                history is capped, e.g. [15, "1D"] keeps 52 daily bars; timeframes
+                leaving a local study too few coarse bars raise an Exception
         """
         #websocket.enableTrace(True)
-        ws = websocket.WebSocketApp(
-            self._ws_url,
-            on_open=lambda ws: self.on_open(ws, type, **kwargs),
-            on_close=self.on_close,
-            on_message=lambda ws, message: self.on_message(ws, message),
-            on_error=self.on_error)
-        self._ws = ws;
-        ws.run_forever()
+        self._decoder.reset()
+        self._closing.clear()
+        self._resubscribe = False
+        self._on_result = kwargs.get("on_result")
+        if type == "quote":
+            self._quotes = QuoteTable(kwargs.get("syms") or self._syms)
+        elif type == "chart":
+            if kwargs.get("timeframes"):
+                # Raises before connecting when the coarse history is too short
+                self._coarse_histbars(kwargs.get("timeframes"),
+                                      kwargs.get("histbars") or self._histbars,
+                                      kwargs.get("indicators") or self._indicators)
+            with self._lock:
+                self._track(kwargs.get("syms") or self._syms, self._study_names(
+                    kwargs.get("indicators") or self._indicators, kwargs.get("timeframes")))
+        deadline = None
+        if kwargs.get("timeout"):
+            deadline = threading.Timer(kwargs.get("timeout"), self.close)
+            deadline.daemon = True
+            deadline.start()
+        try:
+            while True:
+                ws = websocket.WebSocketApp(
+                    self._ws_url,
+                    on_open=lambda ws: self.on_open(ws, type, **kwargs),
+                    on_close=self.on_close,
+                    on_message=lambda ws, message: self.on_message(ws, message),
+                    on_error=self.on_error)
+                if self._recorder:
+                    self._recorder.attach(ws)
+                self._ws = ws;
+                self._connect_started = time.perf_counter()
+                # Without pings, ping_timeout only bounds how long the dispatcher waits on
+                # the socket, so a close() from the deadline or another thread lands quickly.
+                # websocket-client validates UTF-8 in pure Python before decoding, which
+                # dominates large messages; on_message decodes the raw bytes in C instead.
+                ws.run_forever(ping_timeout=1, skip_utf8_validation=True)
+                if (not self._reconnect or self._closing.is_set()
+                        or (self._completed.is_set() and not self._keep_alive)):
+                    break
+                if self._dropped_at is None:
+                    self._dropped_at = time.perf_counter()
+                # Full jitter, so many clients dropped together do not reconnect together
+                delay = random.uniform(
+                    0, min(self._max_backoff, self._backoff * 2 ** self._attempt))
+                self._attempt += 1
+                if self._closing.wait(delay):
+                    break
+                self._decoder.reset()
+                # Until a first connection subscribed there is nothing to resubscribe
+                with self._lock:
+                    self._resubscribe = bool(self._state)
+        finally:
+            if deadline:
+                deadline.cancel()
+            # Studies that never arrived won't anymore
+            for future in self._futures.values():
+                if future.cancel():
+                    future.set_running_or_notify_cancel()
+
+    def stream(self, maxsize=1024, policy="drop_oldest", **kwargs):
+        """
+        Yields PriceEvent, BarEvent and StudyEvent of a live chart subscription, or the
+        PriceEvent of a quote one with type="quote" (same kwargs as get), until the
+        socket closes or the generator is closed. At most maxsize events are queued,
+        policy is "drop_oldest" or "block", see stream.py.
+        """
+        events = EventQueue(maxsize, policy)
+        self._events = events
+        self._outbox = []
+        self._keep_alive = True
+
+        def run():
+            try:
+                self.get(kwargs.pop("type", "chart"), **kwargs)
+            finally:
+                events.close()
+
+        t = threading.Thread(target=run)
+        t.daemon = True
+        t.start()
+        try:
+            yield from events
+        finally:
+            events.close()
+            self.close()
 
     def get_technical_results(self):
-        return self._alerts.get("indicators")
+        with self._lock:
+            return {
+                sym: dict(indicators)
+                for sym, indicators in self._alerts.get("indicators").items()
+            }
+
+    def get_quotes(self) -> QuoteTable:
+        """ Live lp/volume/time of a quote get, read with get_quotes().get(sym) """
+        return self._quotes
+
+    def get_bars(self, sym: str, timeframe=None) -> BarBuffer:
+        """
+        Historical and live bars of sym, read columns with get_bars(sym).column("close").
+        timeframe picks one of the resampled timeframes of a get with timeframes.
+        """
+        if timeframe is not None:
+            for state in list(self._state.values()):
+                resampled = state.get("resampled", {}).get(str(timeframe))
+                if state.get("sym") == sym and resampled:
+                    return resampled[0].bars
+        return self._bars.get(sym)
+
+    def get_timings(self):
+        """ Seconds each phase of the chart session of every symbol took, e.g. {sym: {"series": 0.4}} """
+        with self._lock:
+            return {
+                state.get("sym"): dict(state.get("spans"))
+                for state in self._state.values()
+            }
+
+    def close(self):
+        self._closing.set()
+        if self._ws:
+            self._ws.close()
+
+    def wait(self, timeout=None) -> bool:
+        """ Blocks until every requested study is calculated, False on timeout """
+        return self._completed.wait(timeout)
+
+    def as_completed(self, syms=None, indicators=None, timeout=None):
+        """
+        Yields (sym, indicator, vals) as each study of the current bar is calculated,
+        while get runs in another thread. Stops early when get gives up on the rest.
+        Pass the syms and indicators of the get call when it may not have started yet.
+        """
+        with self._lock:
+            if syms and indicators:
+                self._track(syms, indicators)
+            keys = {future: key for key, future in self._futures.items()}
+        try:
+            for future in concurrent.futures.as_completed(keys, timeout):
+                if not future.cancelled():
+                    yield (*keys[future], future.result())
+        except concurrent.futures.TimeoutError:
+            return
 
     def on_message(self, ws, message):
-        pattern = re.compile(r'~m~\d+~m~~h~\d+$')
-        if pattern.match(message):
-            ws.send(message)
-        else:
-            msg_body = re.compile(r'~m~\d+~m~')
-            messages = msg_body.split(message)
-            for msg in messages:
-                if msg:
-                    parsed_msg = json.loads(msg)
-                    params = parsed_msg.get("p")
-                    if parsed_msg.get("m") == "timescale_update":
-                        # timescale_update -> initial historical data
-                        # TODO: handling of these data for plotting on UI
-                        continue
-                    if parsed_msg.get("m") == "du":
-                        # du -> data update
-                        sym = self._state.get(params[0]).get("sym")
-                        now = datetime.datetime.now().strftime(
-                            '%Y-%m-%d %H:%M:%S')
-                        for k, v in params[1].items():
-                            #print(sym)
-                            if v.get("st"):
-                                # study
-                                indicator = k.split("_")[0]
-                                vals = v.get("st")[0].get("v")
-                                #print(v.get("st"))
-                                current_time = int(time.time())
-                                if (int(vals[0]) != current_time - current_time % 14400):
-                                    continue
-                                if(self._study_completed.get(sym+indicator)):
-                                    continue
-                                self._study_completed[sym+indicator] = True
-                                self._current_calculated_study_number +=1
-
-                                val = vals[1]
-                                val_dict = {"dtime": now, indicator: val}
-                                #print({sym: val_dict})
-                                if not self._alerts["indicators"].get(sym):
-                                    self._alerts["indicators"][sym] = {}
-                                self._alerts["indicators"][sym][
-                                    indicator] = vals
-                            elif v.get("s"):
-                                # series
-                                vals = v.get("s")[0].get("v")
-                                val_dict = dict(
-                                    zip([
-                                        "dtime", "open", "high", "low", "last",
-                                        "vol"
-                                    ], vals))
-                                val_dict["dtime"] = now
-                                # print({sym: val_dict})
-                                if not self._alerts["price"].get(sym):
-                                    self._alerts["price"][sym] = {}
-                                self._alerts["price"][sym]["last"] = val_dict[
-                                    "last"] 
-                        threshold = len(self._inds) + len(self._symbols) if len(self._inds) > 1 else len(self._symbols)
-                        if(self._current_calculated_study_number >= threshold):
-                            self._ws.close()
-                            break
+        if not REGISTRY.enabled:
+            return self._on_message(ws, message)
+        started = time.perf_counter()
+        REGISTRY.inc("messages_total")
+        REGISTRY.inc("bytes_total", len(message))
+        self._on_message(ws, message, REGISTRY)
+        REGISTRY.observe("message_seconds", time.perf_counter() - started)
+
+    def _on_message(self, ws, message, registry=None):
+        if isinstance(message, bytes):
+            message = message.decode("utf-8")
+        for kind, payload in self._decoder.feed(message):
+            if registry:
+                count_frame(registry, kind)
+            if kind == HEARTBEAT:
+                # Heartbeats are echoed back as-is, no need to parse them
+                ws.send(encode(payload))
+            elif kind == "qsd":
+                self._on_quote(parse(payload).get("p"))
+                if self._outbox:
+                    self._flush()
+            elif kind in PHASES:
+                with self._lock:
+                    self._on_phase(kind, parse(payload).get("p"))
+            elif kind == "du" or kind == "timescale_update":
+                # du -> data update, timescale_update -> initial historical data
+                with self._lock:
+                    if kind == "du":
+                        completed = self._on_data_update(parse(payload).get("p"))
+                    else:
+                        completed = self._on_timescale_update(parse(payload).get("p"))
+                if self._outbox:
+                    self._flush()
+                if self._results:
+                    self._notify()
+                if completed and not self._completed.is_set():
+                    self._completed.set()
+                    if not self._keep_alive:
+                        self._ws.close()
+                        break
+
+    def _flush(self):
+        """ Hands the events of the last packet to the stream, outside of self._lock """
+        events, self._outbox = self._outbox, []
+        for event in events:
+            self._events.put(event)
+
+    def _notify(self):
+        """ Calls on_result with the studies of the last packet, outside of self._lock """
+        results, self._results = self._results, []
+        for result in results:
+            self._on_result(*result)
+
+    def _on_quote(self, params):
+        """ Stores a qsd packet, ["qs_...", {"n": sym, "s": "ok", "v": {"lp": ...}}] """
+        data = params[1]
+        values = data.get("v")
+        if data.get("s") != "ok" or not values or self._quotes is None:
+            return
+        sym = data.get("n")
+        # lp_time is only sent with lp, volume alone is stamped on receipt
+        quote_time = values.get("lp_time") or time.time()
+        if self._quotes.update(sym, values.get("lp"), values.get("volume"), quote_time):
+            if self._outbox is not None:
+                self._outbox.append(PriceEvent(sym, *self._quotes.get(sym)))
+
+    def _on_phase(self, kind, params):
+        """ Times the phase of a chart session ended by a symbol_resolved, series_completed... """
+        state = self._state.get(params[0])
+        if state is None or state.get("sent") is None:
+            return
+        elapsed = time.perf_counter() - state.get("sent")
+        phase = PHASES[kind]
+        span = phase
+        if phase == "study":
+            # One span per study, params[1] is the study id e.g. dbs_0
+            span = f"study:{params[1].split('_')[0]}"
+        if span not in state.get("spans"):
+            state.get("spans")[span] = elapsed
+            if REGISTRY.enabled:
+                REGISTRY.observe("phase_seconds", elapsed, (("phase", phase), ))
+
+    def _mark_sent(self):
+        """ Starts the phase timers of the chart sessions about to be sent """
+        now = time.perf_counter()
+        for state in self._state.values():
+            if state.get("sent") is None:
+                state["sent"] = now
+                if self._handshake is not None:
+                    state.get("spans")["handshake"] = self._handshake
+
+    def _on_timescale_update(self, params):
+        state = self._state.get(params[0])
+        bars = self._bars.get(state.get("sym"))
+        for v in params[1].values():
+            if v.get("s"):
+                bars.extend(bar.get("v") for bar in v.get("s"))
+                self._resample(state, [bar.get("v") for bar in v.get("s")])
+                if self._store is not None:
+                    self._persist(state, bars)
+                if self._outbox is not None and bars:
+                    # History is read with get_bars, only the current bar is an update
+                    self._outbox.append(BarEvent(state.get("sym"), list(bars.last())))
+        self._update_local_studies(state)
+        return self._is_completed()
+
+    def _on_data_update(self, params):
+        """ Stores a du packet, returns True once every requested study is calculated """
+        state = self._state.get(params[0])
+        sym = state.get("sym")
+        for k, v in params[1].items():
+            #print(sym)
+            if v.get("st"):
+                # study, the latest bar comes last
+                indicator = k.split("_")[0] + state.get("suffix", "")
+                vals = v.get("st")[-1].get("v")
+                #print(v.get("st"))
+                self._store_study(state, indicator, vals)
+            elif v.get("s"):
+                # series, bars are merged in place into the symbol's BarBuffer
+                bars = self._bars.get(sym)
+                for bar in v.get("s"):
+                    bars.update(bar.get("v"))
+                    if self._outbox is not None:
+                        self._outbox.append(BarEvent(sym, bar.get("v")))
+                self._resample(state, [bar.get("v") for bar in v.get("s")])
+                if self._store is not None:
+                    self._persist(state, bars)
+                if not self._alerts["price"].get(sym):
+                    self._alerts["price"][sym] = {}
+                last = bars.last()
+                self._alerts["price"][sym]["last"] = last[4]
+                if self._outbox is not None:
+                    self._outbox.append(PriceEvent(sym, last[4], last[5], last[0]))
+                self._update_local_studies(state)
+        return self._is_completed()
+
+    def _persist(self, state, bars):
+        """ Appends the bars closed since the last stored one, every bar but the live one """
+        times = bars.column("time")
+        if len(times) < 2:
+            return
+        timeframe = state.get("timeframe")
+        last = self._store.last(state.get("sym"), timeframe)
+        if times[-2] <= last:
+            return
+        first = len(times) - 1
+        while first > 0 and times[first - 1] > last:
+            first -= 1
+        columns = [bars.column(field) for field in FIELDS]
+        self._store.append(state.get("sym"), timeframe, (
+            [column[i] for column in columns] for i in range(first, len(times) - 1)))
+
+    def _resample(self, state, bars):
+        """ Folds new bars of the series into every coarser timeframe of the session """
+        resampled = state.get("resampled")
+        if not resampled:
+            return
+        for resampler, _ in resampled.values():
+            resampler.extend(bars)
+
+    def _update_local_studies(self, state):
+        studies = state.get("local")
+        if studies:
+            bars = self._bars.get(state.get("sym"))
+            suffix = state.get("suffix", "")
+            for indicator, study in studies.items():
+                vals = study.update(bars)
+                if vals:
+                    self._store_study(state, indicator + suffix, vals)
+        for timeframe, (resampler, studies) in state.get("resampled", {}).items():
+            for indicator, study in studies.items():
+                vals = study.update(resampler.bars)
+                if vals:
+                    self._store_study(state, f"{indicator}@{timeframe}", vals, resampler.bars)
+
+    def _is_completed(self):
+        return bool(self._futures) and self._pending == 0
+
+    def _track(self, syms, indicators):
+        """ Registers a pending future for every (sym, indicator) that is not tracked yet """
+        for sym in syms:
+            for indicator in indicators:
+                if (sym, indicator) not in self._futures:
+                    self._futures[(sym, indicator)] = concurrent.futures.Future()
+                    self._pending += 1
+                    self._completed.clear()
+
+    def _bar_time(self, state):
+        """
+        Open time of the bar a study has to reach to count as calculated: the latest
+        bar of the series, or the current bar of the timeframe before any bar arrived.
+        """
+        bars = self._bars.get(state.get("sym"))
+        if bars:
+            return bars.last()[0]
+        return bar_open_time(state.get("timeframe"))
+
+    def _store_study(self, state, indicator, vals, bars=None):
+        """ bars are the ones vals were calculated from when not the session's series """
+        sym = state.get("sym")
+        bar_time = bars.last()[0] if bars is not None and len(bars) else self._bar_time(state)
+        if vals[0] < bar_time:
+            if REGISTRY.enabled:
+                REGISTRY.inc("st_dropped_total")
+            return
+        future = self._futures.get((sym, indicator))
+        if future is not None and not future.done():
+            future.set_result(vals)
+            self._pending -= 1
+            if self._on_result:
+                # Called by _notify once the packet is handled, so it may use the lock
+                self._results.append((sym, indicator, vals))
+        if self._outbox is not None:
+            self._outbox.append(StudyEvent(sym, indicator, vals))
+
+        #print({sym: vals})
+        if not self._alerts["indicators"].get(sym):
+            self._alerts["indicators"][sym] = {}
+        self._alerts["indicators"][sym][
+            indicator] = vals
 
     @staticmethod
     def on_error(ws, error):
         print(error)
 
     @staticmethod
-    def on_close(ws):
+    def on_close(ws, *args):
         print("### closed ###")
 
     def on_open(self, ws, type: str, **kwargs):
+        if self._connect_started is not None:
+            self._handshake = time.perf_counter() - self._connect_started
+            if REGISTRY.enabled:
+                REGISTRY.observe("phase_seconds", self._handshake, (("phase", "handshake"), ))
+        self._attempt = 0
+        if self._dropped_at is not None:
+            if REGISTRY.enabled:
+                REGISTRY.inc("reconnects_total")
+                REGISTRY.observe("phase_seconds", time.perf_counter() - self._dropped_at,
+                                 (("phase", "reconnect"), ))
+            self._dropped_at = None
+
         def run(*args, **kwargs):
             # ~m~52~m~{"m":"quote_create_session","p":["qs_3bDnffZvz5ur"]}
             # ~m~395~m~{"m":"quote_set_fields","p":["qs_3bDnffZvz5ur","ch","chp","lp"]}
@@ -135,12 +517,11 @@ class IntradayPriceManager():
             timeframe = f'{kwargs.get("timeframe") or self._timeframe}'
             indicators = kwargs.get("indicators") or self._indicators
             histbars = kwargs.get("histbars") or self._histbars
+            local = kwargs.get("local_indicators", False)
+            timeframes = kwargs.get("timeframes")
             send = self._send
             #my_auth_token = self.get_auth_token()
 
-            self._inds = indicators
-            self._symbols = syms
-
 
             #send(ws, "set_auth_token", [my_auth_token])
 
@@ -150,56 +531,179 @@ class IntradayPriceManager():
             if not args or (args and args[0] == "quote"):
                 session = self._gen_session()  # Quote session ID
                 send(ws, "quote_create_session", [session])
-                send(ws, "quote_set_fields", [session, "lp", "volume"])
-                [ws.send(self._add_symbol(session, s)) for s in syms]
+                send(ws, "quote_set_fields", [session, "lp", "lp_time", "volume"])
+                for msg in batch([self._add_symbol(session, s) for s in syms]):
+                    ws.send(msg)
                 send(ws, "quote_fast_symbols", [session, *syms])
                 send(ws, "quote_hibernate_all", [session])
 
             # Chart session - Prefer to use this over quote sessions since it has a historical series
+            elif self._resubscribe:
+                msgs = self._resubscribe_messages()
+                for msg in batch(msgs):
+                    ws.send(msg)
             else:
-                for i, sym in enumerate(syms):
-                    # Each ticker warrants a separate chart session ID
-                    c_session = self._gen_session(type="chart")
-                    self._state[c_session] = {
-                        "sym": sym,
-                        "indicators": [],
-                        "series": [],
-                        "timeframe": timeframe
-                    }
-
-                    # Users are allowed to select specific tickers
-                    send(ws, "chart_create_session", [c_session, ""])
-                    send(ws, "switch_timezone", [c_session, "Asia/Singapore"])
-                    send(ws, "resolve_symbol", [
-                        c_session, f"symbol_{i}",
-                        self._add_chart_symbol(sym)
-                    ])
-                    # s (in resp) -> series
-                    self._state[c_session].get("series").append(f"s_{i}")
-                    send(ws, "create_series", [
-                        c_session, f"s_{i}", f"s_{i}", f"symbol_{i}",
-                        timeframe, histbars
-                    ])
-
-                    for indicator in indicators:
-                        # Users are allowed to select specific indicators
-                        # st (in resp) -> study
-                        self._state[c_session].get("indicators").append(
-                            f"{indicator}_{i}")
-                        send(ws, "create_study", [
-                            c_session, f"{indicator}_{i}", f"{indicator}_{i}",
-                            f"s_{i}", "Script@tv-scripting-101!",
-                            self._indicator_mapper(indicator)
-                        ])
+                msgs = self._chart_messages(syms, timeframe, indicators, histbars, local,
+                                            timeframes)
+                self._mark_sent()
+                # A few large writes instead of one per frame
+                for msg in batch(msgs):
+                    ws.send(msg)
 
         self._t = threading.Thread(target=run, args=(type, ), kwargs=kwargs)
         self._t.setDaemon(True)
         self._t.start()
 
+    def _study_names(self, indicators, timeframes=None):
+        """ Names the studies of indicators are stored under, see the timeframes kwarg of get """
+        if not timeframes:
+            return list(indicators)
+        timeframes = sorted((str(tf) for tf in timeframes), key=timeframe_minutes)
+        return [
+            f"{indicator}@{timeframe}" for timeframe in timeframes for indicator in indicators
+            if timeframe == timeframes[0] or indicator.lower() in LOCAL_STUDIES
+        ]
+
+    def _chart_messages(self, syms, timeframe, indicators, histbars, local=False,
+                        timeframes=None):
+        """ Registers one chart session per symbol in self._state, returns the messages creating them """
+        msgs = []
+        coarser = []
+        resampled_histbars = int(histbars)
+        if timeframes:
+            # The finest timeframe is subscribed, with enough bars for the coarsest
+            timeframe, coarser, histbars = self._coarse_histbars(
+                timeframes, resampled_histbars, indicators)
+        with self._lock:
+            self._track(syms, self._study_names(indicators, timeframes))
+        for i, sym in enumerate(syms):
+            # Each ticker warrants a separate chart session ID
+            c_session = self._gen_session(type="chart")
+            state = self._state[c_session] = {
+                "sym": sym,
+                "index": i,
+                "indicators": [],
+                "series": [],
+                "timeframe": timeframe,
+                "histbars": histbars,
+                "local": {},
+                # Appended to the name of the studies of the series, @timeframe if resampled
+                "suffix": f"@{timeframe}" if timeframes else "",
+                # timeframe -> (Resampler, {indicator: local study})
+                "resampled": {
+                    tf: (Resampler(tf, resampled_histbars, TIMEZONE), {
+                        indicator: LOCAL_STUDIES[indicator.lower()]()
+                        for indicator in indicators if indicator.lower() in LOCAL_STUDIES
+                    })
+                    for tf in coarser
+                },
+                # phase -> seconds, see PHASES
+                "spans": {},
+                "sent": None
+            }
+            if sym not in self._bars:
+                self._bars[sym] = BarBuffer(int(histbars))
+                if self._store is not None:
+                    self._bars[sym].extend(self._store.tail(sym, timeframe, int(histbars)))
+            # Earlier or stored bars of the series seed the coarser timeframes
+            bars = self._bars[sym]
+            self._resample(state, list(zip(*(bars.column(field) for field in FIELDS))))
+            # s (in resp) -> series
+            state.get("series").append(f"s_{i}")
+
+            for indicator in indicators:
+                if local and indicator.lower() in LOCAL_STUDIES:
+                    # Computed from the series by _update_local_studies
+                    state.get("local")[indicator] = LOCAL_STUDIES[indicator.lower()]()
+                    continue
+                # Users are allowed to select specific indicators
+                # st (in resp) -> study
+                state.get("indicators").append(f"{indicator}_{i}")
+            # Only the bars missing from the preloaded or earlier ones are requested
+            msgs.extend(self._session_messages(c_session, state, self._missed_bars(state)))
+        return msgs
+
+    def _coarse_histbars(self, timeframes, histbars, indicators):
+        """
+        (finest timeframe, the coarser ones, histbars of the finest) of a get with
+        timeframes. Raises when the MAX_HISTBARS cap leaves a coarser timeframe fewer
+        bars than one of its local studies needs to return a value.
+        """
+        coarser = sorted((str(tf) for tf in timeframes), key=timeframe_minutes)
+        timeframe = coarser.pop(0)
+        minutes = timeframe_minutes(timeframe)
+        ratio = timeframe_minutes(coarser[-1]) // minutes if coarser else 1
+        fine_histbars = min(MAX_HISTBARS, int(histbars) * ratio)
+        for tf in coarser:
+            available = fine_histbars // (timeframe_minutes(tf) // minutes)
+            for indicator in indicators:
+                study = LOCAL_STUDIES.get(indicator.lower())
+                if study is not None and available < study().min_bars:
+                    raise Exception(
+                        f"timeframes {list(timeframes)} give at most {available} {tf} bars, "
+                        f"{indicator} needs {study().min_bars}; drop {tf} or raise the "
+                        f"finest timeframe")
+        return timeframe, coarser, fine_histbars
+
+    def _session_messages(self, c_session, state, histbars):
+        """ Messages creating the chart session c_session of state on a new connection """
+        create = self._create_msg
+        i = state.get("index")
+        # Users are allowed to select specific tickers
+        msgs = [
+            create("chart_create_session", [c_session, ""]),
+            create("switch_timezone", [c_session, TIMEZONE]),
+            create("resolve_symbol", [
+                c_session, f"symbol_{i}",
+                self._add_chart_symbol(state.get("sym"))
+            ]),
+            create("create_series", [
+                c_session, f"s_{i}", f"s_{i}", f"symbol_{i}",
+                state.get("timeframe"), histbars
+            ])
+        ]
+        for study_id in state.get("indicators"):
+            indicator = study_id.rsplit("_", 1)[0]
+            msgs.append(self._study_msg(c_session, study_id, f"s_{i}", indicator))
+        return msgs
+
+    def _resubscribe_messages(self):
+        """ Messages recreating every chart session of self._state after a reconnect """
+        msgs = []
+        with self._lock:
+            for c_session, state in self._state.items():
+                msgs.extend(self._session_messages(c_session, state, self._missed_bars(state)))
+        return msgs
+
+    def _missed_bars(self, state):
+        """ histbars covering the bars opened since the last one received, and that one """
+        bars = self._bars.get(state.get("sym"))
+        if state.get("indicators") or not bars:
+            # Server side studies are calculated over the bars of the series only
+            return state.get("histbars")
+        seconds = timeframe_minutes(state.get("timeframe")) * 60
+        missed = int((time.time() - bars.last()[0]) // seconds) + 1
+        return max(1, min(int(state.get("histbars")), missed))
+
     def _send(self, ws, func, params):
         """ Client sends msg to websockets server """
         ws.send(self._create_msg(func, params))
 
+    def _study_msg(self, c_session, study_id, series_id, indicator):
+        """ create_study message, the study payload is serialized once per indicator """
+        payload = self._study_payloads.get(indicator)
+        if payload is None:
+            payload = self._study_payloads[indicator] = json.dumps(
+                self._indicator_mapper(indicator))
+        msg = self._prepend_header(
+            f'{{"m": "create_study", "p": [{json.dumps(c_session)}, "{study_id}", '
+            f'"{study_id}", "{series_id}", "Script@tv-scripting-101!", {payload}]}}')
+
+        if self._debug:
+            print("DEBUG:", msg)
+
+        return msg
+
     def _indicator_mapper(self, indicator: str) -> dict:
         """ Indicator params that are accepted by the tv server """
         return {
@@ -363,7 +867,7 @@ class IntradayPriceManager():
         return "=" + json.dumps({"symbol": sym})
 
     def _prepend_header(self, msg):
-        return f'~m~{len(msg)}~m~{msg}'
+        return encode(msg)
 
 
 """ if __name__ == "__main__":
@@ -0,0 +1,92 @@
+"""
+In-process metrics for the hot paths of IntradayPriceManager, rendered in the Prometheus
+text format by api/metrics.py. Everything is a no-op until the registry is enabled,
+either with TV_METRICS=1 or REGISTRY.enabled = True, and callers check REGISTRY.enabled
+before building labels so a disabled registry costs one attribute lookup.
+"""
+
+import os
+import threading
+from bisect import bisect_left
+
+# Upper bounds in seconds, from a fast on_message call to a slow study compilation
+BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0,
+           5.0, 10.0, 30.0)
+
+
+class _Histogram():
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry():
+    def __init__(self, enabled=False, prefix="tv_"):
+        self.enabled = enabled
+        self._prefix = prefix
+        self._lock = threading.Lock()
+        # (name, labels) -> value, labels being a tuple of (key, value) pairs
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name: str, value=1, labels=()):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels=()):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        """ Prometheus text exposition format """
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                name = self._prefix + name
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{self._labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                name = self._prefix + name
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, count in zip((*BUCKETS, "+Inf"), histogram.counts):
+                    cumulative += count
+                    bucket = self._labels((*labels, ("le", str(bound))))
+                    lines.append(f"{name}_bucket{bucket} {cumulative}")
+                lines.append(f"{name}_sum{self._labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{self._labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _labels(labels):
+        if not labels:
+            return ""
+        return "{" + ",".join(
+            '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+            for k, v in labels) + "}"
+
+
+REGISTRY = Registry(enabled=os.environ.get("TV_METRICS") == "1")
@@ -0,0 +1,60 @@
+"""
+QuoteTable keeps the last price, volume and time of every symbol of a quote session in
+preallocated parallel columns of C doubles, one row per symbol, updated in place.
+"""
+
+from array import array
+
+FIELDS = ("lp", "volume", "time")
+
+_NAN = float("nan")
+
+
+class QuoteTable():
+    __slots__ = ("symbols", "_rows", "_columns")
+
+    def __init__(self, syms):
+        self.symbols = tuple(syms)
+        # sym -> row
+        self._rows = {sym: i for i, sym in enumerate(self.symbols)}
+        # NaN until a symbol's first quote
+        self._columns = tuple(array("d", [_NAN]) * len(self.symbols) for _ in FIELDS)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def update(self, sym, lp=None, volume=None, time=None) -> bool:
+        """ Overwrites the fields given of sym's row, False for a symbol not in the table """
+        i = self._rows.get(sym)
+        if i is None:
+            return False
+        lps, volumes, times = self._columns
+        if lp is not None:
+            lps[i] = lp
+        if volume is not None:
+            volumes[i] = volume
+        if time is not None:
+            times[i] = time
+        return True
+
+    def get(self, sym):
+        """ (lp, volume, time) of sym, None for a symbol not in the table """
+        i = self._rows.get(sym)
+        if i is None:
+            return None
+        return tuple(column[i] for column in self._columns)
+
+    def column(self, field: str) -> memoryview:
+        """
+        Read-only zero-copy view of one field in symbols order. The view follows live
+        updates, copy it (e.g. with .tolist()) for a stable snapshot.
+        """
+        return memoryview(self._columns[FIELDS.index(field)]).toreadonly()
+
+    def snapshot(self) -> dict:
+        """ {sym: (lp, volume, time)} copy of the symbols quoted so far """
+        lps, volumes, times = self._columns
+        return {
+            sym: (lps[i], volumes[i], times[i])
+            for i, sym in enumerate(self.symbols) if lps[i] == lps[i]
+        }
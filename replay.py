@@ -0,0 +1,381 @@
+"""
+Record/replay harness for IntradayPriceManager.
+
+Recorder captures the raw websocket messages of a live session into a JSON lines file:
+
+    ipm = IntradayPriceManager(recorder=Recorder("eth.jsonl"))
+    ipm.get(type="chart", syms=["BINANCE:ETHUSDT"], indicators=["dbs"])
+
+ReplayServer is a local stand-in for wss://data.tradingview.com. It answers
+chart_create_session/resolve_symbol/create_series/create_study with the history and
+study values of the recording, then replays its live updates with their original
+timing (speed=1), faster (speed=10) or as fast as possible (speed=None). Symbols that
+are not in the recording, or every symbol without a recording, get synthetic bars.
+
+    server = ReplayServer("eth.jsonl").start()
+    ipm = IntradayPriceManager()
+    ipm._ws_url = server.url
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+
+import websockets
+
+from frames import HEARTBEAT, FrameDecoder, encode, parse
+from timeframes import timeframe_minutes
+
+
+class Recorder():
+    def __init__(self, path: str):
+        self._path = path
+        self._f = None
+        self._started = None
+        self._lock = threading.Lock()
+
+    def attach(self, ws):
+        """ Records everything a websocket.WebSocketApp sends and receives """
+        send = ws.send
+        on_message = ws.on_message
+
+        def recording_send(data, *args, **kwargs):
+            self.record("out", data)
+            return send(data, *args, **kwargs)
+
+        def recording_on_message(ws, message):
+            self.record("in", message)
+            return on_message(ws, message)
+
+        ws.send = recording_send
+        ws.on_message = recording_on_message
+        return ws
+
+    def record(self, direction: str, message: str):
+        if isinstance(message, bytes):
+            # Without UTF-8 validation websocket-client hands over the raw bytes
+            message = message.decode("utf-8")
+        with self._lock:
+            if self._f is None:
+                self._f = open(self._path, "a")
+                self._started = time.monotonic()
+            self._f.write(json.dumps({
+                "t": round(time.monotonic() - self._started, 6),
+                "d": direction,
+                "m": message
+            }) + "\n")
+
+    def close(self):
+        with self._lock:
+            if self._f:
+                self._f.close()
+                self._f = None
+
+
+def load(path: str):
+    """ Yields (t, direction, message) of a recording """
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                yield entry["t"], entry["d"], entry["m"]
+
+
+class Recording():
+    """ Packets of a recording grouped by symbol, with session and series ids stripped """
+    def __init__(self, path: str):
+        # sym -> {"history": [...], "studies": {indicator: packet}, "live": [(t, packet)]}
+        self.symbols = {}
+        sessions = {}
+        decoders = {"in": FrameDecoder(), "out": FrameDecoder()}
+        for t, direction, message in load(path):
+            for kind, payload in decoders[direction].feed(message):
+                if kind == HEARTBEAT or kind is None:
+                    continue
+                packet = parse(payload)
+                params = packet.get("p")
+                if direction == "out":
+                    if kind == "resolve_symbol":
+                        sym = json.loads(params[2][1:]).get("symbol")
+                        sessions[params[0]] = self.symbols.setdefault(
+                            sym, {"history": [], "studies": {}, "live": []})
+                    continue
+                entry = sessions.get(params[0]) if params else None
+                if entry is None:
+                    continue
+                if kind == "timescale_update":
+                    entry["history"].append(packet)
+                elif kind == "du":
+                    for key, value in params[1].items():
+                        indicator = key.rsplit("_", 1)[0]
+                        if value.get("st") and indicator not in entry["studies"]:
+                            # The first update of a study carries its whole history
+                            entry["studies"][indicator] = {
+                                "m": "du", "p": [params[0], {key: value}]}
+                        else:
+                            entry["live"].append(
+                                (t, {"m": "du", "p": [params[0], {key: value}]}))
+
+
+def _rewrite(packet, session, index):
+    """ Copy of a recorded packet addressed to the client's session and series index """
+    params = packet["p"]
+    body = {}
+    for key, value in params[1].items():
+        name = key.rsplit("_", 1)[0]
+        value = dict(value)
+        if "t" in value:
+            value["t"] = f"s_{index}"
+        body[f"{name}_{index}"] = value
+    return {"m": packet["m"], "p": [session, body, *params[2:]]}
+
+
+class ReplayServer():
+    def __init__(self, path: str = None, speed: float = 1.0, host: str = "127.0.0.1",
+                 port: int = 0, tick_interval: float = None, plots: int = 21):
+        """
+        speed scales the recorded timing of live updates, None sends them at once.
+        tick_interval makes synthetic symbols move every tick_interval seconds.
+        plots is the number of values of a synthetic study.
+        """
+        self._recording = Recording(path) if path else None
+        self._speed = speed
+        self._host = host
+        self._port = port
+        self._tick_interval = tick_interval
+        self._plots = plots
+        self._loop = None
+        self._t = None
+        self._stop = None
+        self._connections = set()
+        # Origin header of every connection, oldest first
+        self.origins = []
+        self.url = None
+
+    def start(self):
+        ready = threading.Event()
+        self._t = threading.Thread(target=self._run, args=(ready, ))
+        self._t.daemon = True
+        self._t.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        """ Drops every connection and stops listening, start() listens on the same port again """
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._stop.set_result, None)
+            self._t.join()
+            self._loop = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self, ready):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._serve(ready))
+        self._loop.close()
+
+    async def _serve(self, ready):
+        self._stop = self._loop.create_future()
+        async with websockets.serve(self._handle, self._host, self._port,
+                                    max_size=None) as server:
+            sock = next(iter(server.sockets))
+            self._port = sock.getsockname()[1]
+            self.url = f"ws://{self._host}:{self._port}"
+            ready.set()
+            await self._stop
+            for ws in list(self._connections):
+                # Abort without a closing handshake, like a dropped connection
+                ws.transport.abort()
+
+    async def _handle(self, ws, path=None):
+        self.origins.append(ws.request.headers.get("Origin"))
+        self._connections.add(ws)
+        connection = _Connection(self, ws)
+        try:
+            await connection.run()
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            connection.cancel()
+            self._connections.discard(ws)
+
+
+class _Connection():
+    """ Server side of one client connection """
+    def __init__(self, server, ws):
+        self._server = server
+        self._ws = ws
+        self._decoder = FrameDecoder()
+        # client chart session -> {"sym", "index", "timeframe", "bars", "studies"},
+        # quote session -> {"quotes": {sym: lp}}
+        self._sessions = {}
+        self._tasks = []
+
+    async def run(self):
+        await self._send({
+            "session_id": "<0.0.0>_replay",
+            "timestamp": int(time.time()),
+            "release": "replay"
+        })
+        self._tasks.append(asyncio.ensure_future(self._heartbeat()))
+        async for message in self._ws:
+            for kind, payload in self._decoder.feed(message):
+                if kind == HEARTBEAT or kind is None:
+                    continue
+                await self._on_packet(kind, parse(payload).get("p"))
+
+    def cancel(self):
+        for task in self._tasks:
+            task.cancel()
+
+    async def _send(self, *packets):
+        # Compact like the real server, FrameDecoder peeks the type from {"m":"
+        await self._ws.send("".join(
+            encode(json.dumps(p, separators=(",", ":"))) for p in packets))
+
+    async def _heartbeat(self):
+        n = 0
+        while True:
+            await asyncio.sleep(10)
+            n += 1
+            await self._ws.send(encode(f"{HEARTBEAT}{n}"))
+
+    async def _on_packet(self, kind, params):
+        if kind == "chart_create_session":
+            self._sessions[params[0]] = {"studies": {}}
+        elif kind == "chart_delete_session":
+            self._sessions.pop(params[0], None)
+        elif kind == "resolve_symbol":
+            sym = json.loads(params[2][1:]).get("symbol")
+            self._sessions[params[0]]["sym"] = sym
+            await self._send({"m": "symbol_resolved", "p": [
+                params[0], params[1], {"name": sym.split(":")[-1], "pro_name": sym}]})
+        elif kind == "create_series":
+            state = self._sessions[params[0]]
+            state["index"] = params[1].split("_")[-1]
+            state["timeframe"] = str(params[4])
+            await self._create_series(params[0], state, int(params[5]))
+        elif kind == "create_study":
+            state = self._sessions[params[0]]
+            await self._create_study(params[0], state, params[1].split("_")[0])
+        elif kind == "quote_create_session":
+            self._sessions[params[0]] = {"quotes": {}}
+            if self._server._tick_interval:
+                self._tasks.append(asyncio.ensure_future(self._tick_quotes(params[0])))
+        elif kind == "quote_add_symbols":
+            quotes = self._sessions[params[0]]["quotes"]
+            for sym in params[1:]:
+                if isinstance(sym, str):
+                    quotes[sym] = random.uniform(1, 1000)
+                    await self._send(self._qsd(params[0], sym, quotes[sym]))
+
+    def _recorded(self, sym):
+        recording = self._server._recording
+        return recording.symbols.get(sym) if recording else None
+
+    async def _create_series(self, session, state, histbars):
+        index = state["index"]
+        recorded = self._recorded(state["sym"])
+        if recorded:
+            await self._send(*[_rewrite(p, session, index) for p in recorded["history"]])
+            self._tasks.append(asyncio.ensure_future(
+                self._replay_live(session, state, recorded["live"])))
+        else:
+            state["bars"] = self._synthetic_bars(state["timeframe"], histbars)
+            await self._send({"m": "timescale_update", "p": [session, {f"s_{index}": {
+                "s": [{"i": i, "v": bar} for i, bar in enumerate(state["bars"])],
+                "ns": {"d": "", "indexes": []}, "t": f"s_{index}"}}]})
+            if self._server._tick_interval:
+                self._tasks.append(asyncio.ensure_future(self._tick(session, state)))
+        await self._send({"m": "series_completed", "p": [session, f"s_{index}", "streaming"]})
+
+    async def _create_study(self, session, state, indicator):
+        index = state["index"]
+        recorded = self._recorded(state["sym"])
+        if recorded and indicator in recorded["studies"]:
+            await self._send(_rewrite(recorded["studies"][indicator], session, index))
+        else:
+            values = [self._study_bar(bar) for bar in state.get("bars") or []]
+            state["studies"][indicator] = values
+            await self._send({"m": "du", "p": [session, {f"{indicator}_{index}": {
+                "st": [{"i": i, "v": v} for i, v in enumerate(values)],
+                "ns": {"d": "", "indexes": []}, "t": f"s_{index}"}}]})
+        await self._send({"m": "study_completed", "p": [
+            session, f"{indicator}_{index}", f"st_{index}"]})
+
+    async def _replay_live(self, session, state, live):
+        speed = self._server._speed
+        started = time.monotonic()
+        first = live[0][0] if live else 0
+        for t, packet in live:
+            if session not in self._sessions:
+                return
+            if speed:
+                delay = (t - first) / speed - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await self._send(_rewrite(packet, session, state["index"]))
+
+    async def _tick(self, session, state):
+        index = state["index"]
+        seconds = timeframe_minutes(state["timeframe"]) * 60
+        while session in self._sessions:
+            await asyncio.sleep(self._server._tick_interval)
+            bars = state["bars"]
+            now = int(time.time())
+            bar_time = now - now % seconds
+            last = bars[-1]
+            close = round(last[4] * random.uniform(0.995, 1.005), 4)
+            if bar_time > last[0]:
+                bars.append([bar_time, last[4], max(last[4], close), min(last[4], close), close, 0.0])
+            else:
+                last[2:5] = [max(last[2], close), min(last[3], close), close]
+                last[5] += random.uniform(0, 100)
+            bar = bars[-1]
+            packets = [{"m": "du", "p": [session, {f"s_{index}": {
+                "s": [{"i": len(bars) - 1, "v": bar}], "t": f"s_{index}"}}]}]
+            for indicator in state["studies"]:
+                packets.append({"m": "du", "p": [session, {f"{indicator}_{index}": {
+                    "st": [{"i": len(bars) - 1, "v": self._study_bar(bar)}],
+                    "t": f"s_{index}"}}]})
+            await self._send(*packets)
+
+    def _qsd(self, session, sym, lp):
+        return {"m": "qsd", "p": [session, {"n": sym, "s": "ok", "v": {
+            "lp": round(lp, 4), "lp_time": int(time.time()),
+            "volume": round(random.uniform(0, 1e6), 2)}}]}
+
+    async def _tick_quotes(self, session):
+        while session in self._sessions:
+            await asyncio.sleep(self._server._tick_interval)
+            quotes = self._sessions[session]["quotes"]
+            packets = []
+            for sym in quotes:
+                quotes[sym] *= random.uniform(0.995, 1.005)
+                packets.append(self._qsd(session, sym, quotes[sym]))
+            if packets:
+                await self._send(*packets)
+
+    def _synthetic_bars(self, timeframe, histbars):
+        seconds = timeframe_minutes(timeframe) * 60
+        now = int(time.time())
+        start = now - now % seconds - (histbars - 1) * seconds
+        close = random.uniform(1, 1000)
+        bars = []
+        for i in range(histbars):
+            open_ = close
+            close = round(open_ * random.uniform(0.98, 1.02), 4)
+            bars.append([start + i * seconds, open_, max(open_, close) * 1.005,
+                         min(open_, close) * 0.995, close, round(random.uniform(0, 1e4), 2)])
+        return bars
+
+    def _study_bar(self, bar):
+        return [bar[0], *[random.choice((0, 0, 0, 1, round(bar[4], 4)))
+                          for _ in range(self._server._plots)]]
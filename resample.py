@@ -0,0 +1,78 @@
+"""
+Resampler folds the bars of a fine series (e.g. 15 minutes) into a coarser timeframe
+(60, 240, "1D", "W") as they arrive, so one create_series serves every timeframe watched
+for a symbol. Coarse bars open at multiples of the timeframe in the chart timezone, days
+at its midnight and weeks on its Monday, like the charts of switch_timezone.
+"""
+
+from bars import BarBuffer
+from timeframes import TIMEZONE, bar_open_time, timeframe_minutes
+
+
+class Resampler():
+    __slots__ = ("timeframe", "bars", "_seconds", "_timezone", "_start", "_end", "_folded",
+                 "_fine")
+
+    def __init__(self, timeframe, capacity: int = 300, timezone: str = TIMEZONE):
+        self.timeframe = str(timeframe)
+        # Coarse bars, oldest first
+        self.bars = BarBuffer(capacity)
+        self._seconds = timeframe_minutes(timeframe) * 60
+        self._timezone = timezone
+        # Epoch seconds bounds of the coarse bar being built
+        self._start = None
+        self._end = None
+        # [open, high, low, volume] of the fine bars of the coarse bar that are closed
+        self._folded = None
+        # Latest fine bar, still updated in place by the server
+        self._fine = None
+
+    def update(self, bar):
+        """ Merges a fine [time, open, high, low, close, volume] bar, volume is optional """
+        self.extend((bar, ))
+
+    def extend(self, bars):
+        """ Merges fine bars oldest first, each coarse bar is written once per call """
+        pending = False
+        for bar in bars:
+            time = bar[0]
+            fine = self._fine
+            if fine is not None and time < fine[0]:
+                # Correction of a fine bar that was already folded in
+                continue
+            if self._start is None or time >= self._end:
+                if pending:
+                    self.bars.update(self._merge(fine))
+                self._start, self._end = self._bounds(time)
+                self._folded = None
+            elif time > fine[0]:
+                # The previous fine bar closed
+                self._fold(fine)
+            self._fine = [time, bar[1], bar[2], bar[3], bar[4], bar[5] if len(bar) > 5 else 0.0]
+            pending = True
+        if pending:
+            self.bars.update(self._merge(self._fine))
+
+    def _fold(self, fine):
+        folded = self._folded
+        if folded is None:
+            self._folded = [fine[1], fine[2], fine[3], fine[5]]
+        else:
+            if fine[2] > folded[1]:
+                folded[1] = fine[2]
+            if fine[3] < folded[2]:
+                folded[2] = fine[3]
+            folded[3] += fine[5]
+
+    def _merge(self, fine):
+        """ Coarse bar of the folded fine bars and fine """
+        folded = self._folded
+        if folded is None:
+            return [self._start, fine[1], fine[2], fine[3], fine[4], fine[5]]
+        return [self._start, folded[0], max(folded[1], fine[2]), min(folded[2], fine[3]),
+                fine[4], folded[3] + fine[5]]
+
+    def _bounds(self, time):
+        """ Open and close time of the coarse bar holding time, in the chart timezone """
+        start = bar_open_time(self.timeframe, time, self._timezone)
+        return start, start + self._seconds
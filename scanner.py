@@ -0,0 +1,100 @@
+"""
+ScanCoordinator splits a large symbol universe into shards, each scanned over its own
+websocket by its own IntradayPriceManager, in threads or, with processes=True, in worker
+processes so the JSON parsing of every shard gets a core of its own.
+
+    coordinator = ScanCoordinator(shards=4, processes=True)
+    results = coordinator.get_technical_results(syms, ["dbs"], timeframe=240)
+
+Symbols of a shard that failed or ran out of time are spread over fresh shards and
+scanned again, so one slow connection does not hold back the whole scan.
+"""
+
+import concurrent.futures
+import math
+
+from intraday import IntradayPriceManager
+from metrics import REGISTRY
+
+
+def scan_shard(syms, indicators, timeframe, histbars, local_indicators, timeout,
+               ws_url=None):
+    """ get_technical_results of one chart get, module level so worker processes can run it """
+    ipm = IntradayPriceManager()
+    if ws_url:
+        ipm._ws_url = ws_url
+    ipm.get(type="chart", syms=syms, indicators=indicators, timeframe=timeframe,
+            histbars=histbars, local_indicators=local_indicators, timeout=timeout)
+    return ipm.get_technical_results()
+
+
+def partition(syms, shards) -> list:
+    """ syms split into at most shards contiguous lists of near equal size """
+    if not syms:
+        return []
+    size = math.ceil(len(syms) / shards)
+    return [syms[i:i + size] for i in range(0, len(syms), size)]
+
+
+class ScanCoordinator():
+    def __init__(self, shards=4, processes=False, timeout=60, retries=1, ws_url=None):
+        """
+        timeout bounds each shard in seconds, retries is how many times the symbols
+        missing after a round are rescanned.
+        """
+        self._shards = shards
+        self._processes = processes
+        self._timeout = timeout
+        self._retries = retries
+        self._ws_url = ws_url
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get_technical_results(self, syms, indicators, timeframe=240, histbars=300,
+                              local_indicators=False):
+        """ Merged get_technical_results of every shard, symbols never calculated are left out """
+        results = {}
+        pending = list(syms)
+        for attempt in range(self._retries + 1):
+            if not pending:
+                break
+            if attempt and REGISTRY.enabled:
+                REGISTRY.inc("shard_retries_total", len(pending))
+            futures = [
+                self._executor_for().submit(
+                    scan_shard, shard, list(indicators), timeframe, histbars,
+                    local_indicators, self._timeout, self._ws_url)
+                for shard in partition(pending, self._shards)
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    shard_results = future.result()
+                except Exception as err:
+                    # Its symbols are still pending and go to the next round
+                    print(err)
+                    continue
+                for sym, studies in shard_results.items():
+                    results.setdefault(sym, {}).update(studies)
+            pending = [
+                sym for sym in pending
+                if len(results.get(sym, ())) < len(indicators)
+            ]
+        return results
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _executor_for(self):
+        if self._executor is None:
+            if self._processes:
+                self._executor = concurrent.futures.ProcessPoolExecutor(self._shards)
+            else:
+                self._executor = concurrent.futures.ThreadPoolExecutor(self._shards)
+        return self._executor
@@ -0,0 +1,68 @@
+"""
+SharedPriceManager keeps one warm IntradayPriceManager per subscription for the whole
+process, so repeated requests read the latest study values from memory instead of
+opening a new websocket, re-resolving every symbol and recreating every study.
+"""
+
+import threading
+
+from intraday import IntradayPriceManager
+
+
+class _Subscription():
+    def __init__(self, syms, indicators, timeframe, histbars):
+        # Reconnects keep the bars and studies warm across dropped sockets
+        self._ipm = IntradayPriceManager(keep_alive=True, reconnect=True)
+        self._t = threading.Thread(
+            target=self._ipm.get,
+            args=("chart", ),
+            kwargs={
+                "syms": list(syms),
+                "indicators": list(indicators),
+                "timeframe": timeframe,
+                "histbars": histbars
+            })
+        self._t.daemon = True
+        self._t.start()
+
+    def is_alive(self) -> bool:
+        return self._t.is_alive()
+
+    def get_technical_results(self, timeout):
+        # Only the first request of a subscription waits for the studies, later ones
+        # are answered straight from memory
+        self._ipm.wait(timeout)
+        return self._ipm.get_technical_results()
+
+    def close(self):
+        self._ipm.close()
+
+
+class SharedPriceManager():
+    def __init__(self, timeout=30):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+        self._timeout = timeout
+
+    def get_technical_results(self, syms, indicators, timeframe=240, histbars=300,
+                              timeout=None):
+        """
+        Same results as IntradayPriceManager.get_technical_results after a chart get.
+        Concurrent callers asking for the same subscription share one websocket; if
+        the studies are not calculated within timeout the partial results are returned.
+        """
+        key = (tuple(syms), tuple(indicators), timeframe, histbars)
+        with self._lock:
+            subscription = self._subscriptions.get(key)
+            if subscription is None or not subscription.is_alive():
+                # A dropped socket is replaced by a fresh subscription
+                subscription = _Subscription(*key)
+                self._subscriptions[key] = subscription
+        return subscription.get_technical_results(
+            self._timeout if timeout is None else timeout)
+
+    def close(self):
+        with self._lock:
+            for subscription in self._subscriptions.values():
+                subscription.close()
+            self._subscriptions.clear()
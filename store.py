@@ -0,0 +1,172 @@
+"""
+BarStore persists the closed bars of every (symbol, timeframe) on disk so a restarted
+manager only asks the server for the bars it has not seen. Each series is an append-only
+file read through mmap: a header (struct "<Qd", record count and last bar time) then
+fixed-width little-endian records (struct "<6d", time open high low close volume).
+The header is rewritten after the records of an append, records past its count are
+ignored. index.jsonl maps each series to its file and only grows by one line per new
+series, so an append costs the same however many series are stored.
+
+    store = BarStore("bars")
+    ipm = IntradayPriceManager(store=store)
+"""
+
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+from array import array
+
+HEADER = struct.Struct("<Qd")
+RECORD = struct.Struct("<6d")
+FIELDS = 6
+
+
+class BarStore():
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = threading.Lock()
+        # "sym|timeframe" -> file
+        self._index = {}
+        self._files = set()
+        # "sym|timeframe" -> [count, last] of the file header, read on first use
+        self._headers = {}
+        # The index ends with a line torn by a crash
+        self._torn = False
+        # Maps backing views handed out by load, kept open while they may be in use
+        self._maps = {}
+        os.makedirs(path, exist_ok=True)
+        self._load_index()
+
+    def __len__(self):
+        return len(self._index)
+
+    def last(self, sym: str, timeframe) -> float:
+        """ Time of the last stored bar, 0 when nothing is stored """
+        with self._lock:
+            return self._header(self._key(sym, timeframe))[1]
+
+    def count(self, sym: str, timeframe) -> int:
+        with self._lock:
+            return self._header(self._key(sym, timeframe))[0]
+
+    def load(self, sym: str, timeframe) -> memoryview:
+        """
+        Zero-copy view of the stored bars as a flat sequence of doubles, bar i being
+        view[6 * i:6 * i + 6]. The view is read-only and stays valid until close().
+        """
+        key = self._key(sym, timeframe)
+        with self._lock:
+            count = self._header(key)[0]
+            if not count:
+                return memoryview(b"").cast("d")
+            size = HEADER.size + count * RECORD.size
+            mapped = self._maps.get(key)
+            if mapped is None or len(mapped) < size:
+                with open(os.path.join(self._path, self._index[key]), "rb") as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[key] = mapped
+            view = memoryview(mapped)[HEADER.size:size]
+        if sys.byteorder == "little":
+            return view.cast("d")
+        # Records are little-endian, a big-endian host reads a swapped copy
+        values = array("d")
+        values.frombytes(view)
+        values.byteswap()
+        return memoryview(values)
+
+    def tail(self, sym: str, timeframe, n: int):
+        """ Yields the last n stored bars as lists, oldest first """
+        view = self.load(sym, timeframe)
+        bars = len(view) // FIELDS
+        for i in range(max(0, bars - n), bars):
+            yield view[i * FIELDS:(i + 1) * FIELDS].tolist()
+
+    def append(self, sym: str, timeframe, bars) -> int:
+        """ Stores the bars newer than the last stored one, returns how many were stored """
+        key = self._key(sym, timeframe)
+        with self._lock:
+            header = self._header(key)
+            count, last = header
+            records = []
+            for bar in bars:
+                if bar[0] > last:
+                    records.append(RECORD.pack(*bar[:FIELDS], *[0.0] * (FIELDS - len(bar))))
+                    last = bar[0]
+            if not records:
+                return 0
+            if key not in self._index:
+                self._add_series(key, self._filename(sym, timeframe))
+            path = os.path.join(self._path, self._index[key])
+            with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+                # Overwrites whatever a crash left after the last counted record
+                f.seek(HEADER.size + count * RECORD.size)
+                f.write(b"".join(records))
+                f.truncate()
+                # The count covers the new records only once they are written
+                f.seek(0)
+                f.write(HEADER.pack(count + len(records), last))
+            header[:] = [count + len(records), last]
+            return len(records)
+
+    def close(self):
+        with self._lock:
+            for mapped in self._maps.values():
+                try:
+                    mapped.close()
+                except BufferError:
+                    # A view of it is still alive, the map goes with the view
+                    pass
+            self._maps.clear()
+
+    @staticmethod
+    def _key(sym, timeframe):
+        return f"{sym}|{timeframe}"
+
+    def _header(self, key):
+        """ [count, last] of a series, [0, 0] when nothing is stored """
+        header = self._headers.get(key)
+        if header is None:
+            header = [0, 0]
+            if key in self._index:
+                try:
+                    with open(os.path.join(self._path, self._index[key]), "rb") as f:
+                        header = list(HEADER.unpack(f.read(HEADER.size)))
+                except (OSError, struct.error):
+                    pass
+            self._headers[key] = header
+        return header
+
+    def _filename(self, sym, timeframe):
+        name = re.sub(r"[^A-Za-z0-9]+", "_", f"{sym}_{timeframe}")
+        filename, n = f"{name}.bars", 1
+        while filename in self._files:
+            n += 1
+            filename = f"{name}_{n}.bars"
+        return filename
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self._path, "index.jsonl")) as f:
+                line = ""
+                for line in f:
+                    try:
+                        key, filename = json.loads(line)
+                    except ValueError:
+                        # Torn last line of a crash, its series was never counted
+                        continue
+                    self._index[key] = filename
+                    self._files.add(filename)
+                self._torn = bool(line) and not line.endswith("\n")
+        except OSError:
+            pass
+
+    def _add_series(self, key, filename):
+        with open(os.path.join(self._path, "index.jsonl"), "a") as f:
+            f.write(("\n" if self._torn else "") + json.dumps([key, filename]) + "\n")
+        self._torn = False
+        self._index[key] = filename
+        self._files.add(filename)
@@ -0,0 +1,141 @@
+"""
+Events and bounded queues of IntradayPriceManager.stream. A queue holds at most maxsize
+events; when the consumer falls behind, the "drop_oldest" policy discards the oldest
+event and "block" holds the websocket reader until there is room again.
+
+    for event in IntradayPriceManager().stream(syms=["BINANCE:ETHUSDT"], indicators=["rsi"]):
+        if isinstance(event, StudyEvent):
+            print(event.sym, event.indicator, event.vals)
+"""
+
+import asyncio
+import threading
+from collections import deque, namedtuple
+
+from metrics import REGISTRY
+
+POLICIES = ("drop_oldest", "block")
+
+# Last price of a symbol, time is the epoch seconds of the bar or quote it comes from
+PriceEvent = namedtuple("PriceEvent", ("sym", "price", "volume", "time"))
+# A bar of the chart series, [time, open, high, low, close, volume]
+BarEvent = namedtuple("BarEvent", ("sym", "bar"))
+# Study values of the current bar, [time, *plots]
+StudyEvent = namedtuple("StudyEvent", ("sym", "indicator", "vals"))
+
+
+def _check_policy(policy):
+    if policy not in POLICIES:
+        raise Exception(f"Invalid policy {policy}, expected one of {POLICIES}")
+
+
+def _count_dropped():
+    if REGISTRY.enabled:
+        REGISTRY.inc("events_dropped_total")
+
+
+class EventQueue():
+    def __init__(self, maxsize=1024, policy="drop_oldest"):
+        _check_policy(policy)
+        self._maxsize = maxsize
+        self._policy = policy
+        self._events = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def put(self, event):
+        with self._cond:
+            if self._policy == "block":
+                while len(self._events) >= self._maxsize and not self._closed:
+                    self._cond.wait()
+            elif len(self._events) >= self._maxsize:
+                self._events.popleft()
+                self.dropped += 1
+                _count_dropped()
+            if self._closed:
+                return
+            self._events.append(event)
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """ Next event, None once the queue is closed and empty or on timeout """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._events or self._closed, timeout):
+                return None
+            if not self._events:
+                return None
+            event = self._events.popleft()
+            self._cond.notify_all()
+            return event
+
+    def close(self):
+        """ Unblocks producers and consumers, events already queued are still read """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __iter__(self):
+        while True:
+            event = self.get()
+            if event is None:
+                return
+            yield event
+
+
+class AsyncEventQueue():
+    """ EventQueue for a single event loop, "block" makes the producer await """
+    def __init__(self, maxsize=1024, policy="drop_oldest"):
+        _check_policy(policy)
+        self._maxsize = maxsize
+        self._policy = policy
+        self._events = deque()
+        # Set when there are events to read or the queue closed, wakes get
+        self._ready = asyncio.Event()
+        # Set whenever an event is taken or the queue closes, wakes a blocked put
+        self._room = asyncio.Event()
+        self._closed = False
+        self.dropped = 0
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def put_nowait(self, event):
+        """ Queues event without waiting, the oldest one is dropped when full """
+        if self._closed:
+            return
+        if len(self._events) >= self._maxsize:
+            self._events.popleft()
+            self.dropped += 1
+            _count_dropped()
+        self._events.append(event)
+        self._ready.set()
+
+    async def put(self, event):
+        if self._policy == "block":
+            while len(self._events) >= self._maxsize and not self._closed:
+                self._room.clear()
+                await self._room.wait()
+        self.put_nowait(event)
+
+    async def get(self):
+        """ Next event, None once the queue is closed and empty """
+        while not self._events:
+            if self._closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        event = self._events.popleft()
+        self._room.set()
+        return event
+
+    def close(self):
+        """ Releases a blocked producer, dropping its event; queued events are still read """
+        self._closed = True
+        self._ready.set()
+        self._room.set()
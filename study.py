@@ -1,17 +1,87 @@
+"""
+Binds the plot values of a study to the plot titles in meta.json. meta.json is read once
+into an immutable Binding per indicator, so binding a scan is a pass over the values.
+
+    bindings = load_bindings()
+    bind_all({"BINANCE:ETHUSDT": {"dbs": [time, plot_0, plot_1, ...]}}, bindings)
+"""
+
+import json
+import os
+from collections import namedtuple
+from types import MappingProxyType
+
+META_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "meta.json")
+
+# Plots that are buy/sell signals, reported while they fire
+SIGNAL_PLOTS = (0, 1, 13, 14, 15, 16)
+
+
+def fired(val) -> bool:
+    return val != 0
+
+
+class Binding(namedtuple("Binding", ("plots", "keep"))):
+    """ plots is a tuple of (plot index, title), keep(val) tells if a value is reported """
+    __slots__ = ()
+
+    @classmethod
+    def compile(cls, meta, signals=SIGNAL_PLOTS, keep=fired):
+        plots = []
+        for i in signals:
+            plot_meta = meta.get(f"plot_{i}")
+            if plot_meta:
+                plots.append((i, plot_meta.get("title") or "null"))
+        return cls(tuple(plots), keep)
+
+    def bind(self, calculation) -> list:
+        """ Fields of the plots of calculation (the study values without the time) that fired """
+        study = []
+        keep = self.keep
+        for i, title in self.plots:
+            if i < len(calculation) and keep(calculation[i]):
+                study.append({"name": title, "value": str(calculation[i]), "inline": True})
+        return study
+
+
+def load_bindings(path=META_PATH):
+    """ Read-only {indicator: Binding} of meta.json """
+    with open(path) as f:
+        meta = json.load(f)
+    return MappingProxyType({
+        indicator: Binding.compile(plots)
+        for indicator, plots in meta.items()
+    })
+
+
+def bind_all(results, bindings) -> dict:
+    """
+    {sym: {indicator: fields}} of results ({sym: {indicator: [time, *values]}}), plot by
+    plot across every symbol. Symbols without a fired plot are left out.
+    """
+    rows = {}
+    for sym, indicators in results.items():
+        for indicator, vals in indicators.items():
+            if indicator in bindings:
+                rows.setdefault(indicator, []).append((sym, vals))
+
+    fields = {}
+    for indicator, vectors in rows.items():
+        binding = bindings[indicator]
+        keep = binding.keep
+        for i, title in binding.plots:
+            # Values start after the bar time
+            column = i + 1
+            for sym, vals in vectors:
+                if column < len(vals) and keep(vals[column]):
+                    fields.setdefault((sym, indicator), []).append(
+                        {"name": title, "value": str(vals[column]), "inline": True})
+
+    response = {}
+    for (sym, indicator), study in fields.items():
+        response.setdefault(sym, {})[indicator] = study
+    return response
+
+
 def bind_result(calculation, meta):
-    study = []
-    for i, val in enumerate(calculation):
-        if(meta.get("plot_" + str(i))):
-            plot_meta = meta.get("plot_" + str(i))
-            plot_meta["title"] = plot_meta["title"] if plot_meta["title"] else "null"
-            plot = {"name": plot_meta["title"], "value": str(val), "inline": True}
-            if("plot_" + str(i) == "plot_0" or "plot_" + str(i) == "plot_1" 
-                or "plot_" + str(i) == "plot_13" or "plot_" + str(i) == "plot_14"
-                    or "plot_" + str(i) == "plot_15" or "plot_" + str(i) == "plot_16"):
-                    
-                if val != 0:
-                    study.append(plot)
-
-            
-
-    return study
\ No newline at end of file
+    return Binding.compile(meta).bind(calculation)
@@ -0,0 +1,39 @@
+import asyncio
+
+from async_intraday import AsyncIntradayPriceManager
+from intraday import IntradayPriceManager
+
+
+def test_concurrent_gets_return_their_own_results(replay_server):
+    async def run():
+        async with AsyncIntradayPriceManager() as ipm:
+            ipm._ws_url = replay_server.url
+            return await asyncio.gather(
+                ipm.get("chart", syms=["BINANCE:A"], indicators=["dbs"], timeout=5),
+                ipm.get("chart", syms=["BINANCE:B", "BINANCE:C"], indicators=["rsi"],
+                        local_indicators=True, timeframe=60, timeout=5))
+
+    first, second = asyncio.run(run())
+    assert {sym: list(studies) for sym, studies in first.items()} == {"BINANCE:A": ["dbs"]}
+    assert sorted(second) == ["BINANCE:B", "BINANCE:C"]
+
+
+def test_no_manager_wide_results():
+    # Results are per request, a manager wide view would always be empty
+    ipm = AsyncIntradayPriceManager()
+    for name in ("get_technical_results", "wait", "as_completed", "get_bars"):
+        assert not hasattr(ipm, name)
+
+
+def test_sends_the_origin_of_the_sync_client(replay_server):
+    async def run():
+        async with AsyncIntradayPriceManager() as ipm:
+            ipm._ws_url = replay_server.url
+            await ipm.get("chart", syms=["BINANCE:A"], indicators=["dbs"], timeout=5)
+
+    asyncio.run(run())
+    ipm = IntradayPriceManager()
+    ipm._ws_url = replay_server.url
+    ipm.get(type="chart", syms=["BINANCE:A"], indicators=["dbs"], timeout=5)
+    assert replay_server.origins[0] is not None
+    assert replay_server.origins[0] == replay_server.origins[-1]
@@ -0,0 +1,80 @@
+import threading
+import time
+
+from cache import ResultCache
+from timeframes import bar_close_time
+
+# 2024-01-01 01:00 UTC, inside the 240 minute bar closing at 04:00
+NOW = 1704070800.0
+
+
+class Clock():
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = ResultCache()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("key", 240, fetch)))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    # Lets every thread reach the flight before the fetch returns
+    time.sleep(0.2)
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert len(calls) == 1
+    assert results == ["value"] * 8
+
+
+def test_least_recently_used_is_evicted():
+    cache = ResultCache(maxsize=2)
+    cache.set("a", 240, 1)
+    cache.set("b", 240, 2)
+    assert cache.get("a", 240, lambda: None) == 1
+    cache.set("c", 240, 3)
+    assert list(cache._entries) == ["a", "c"]
+    assert cache.get("b", 240, lambda: "fetched") == "fetched"
+
+
+def test_entries_expire_when_the_bar_closes(monkeypatch):
+    clock = Clock(NOW)
+    monkeypatch.setattr(time, "time", clock)
+    cache = ResultCache()
+    assert cache.get("key", 240, lambda: 1) == 1
+    assert cache._entries["key"][0] == bar_close_time(240, NOW) == NOW + 3 * 3600
+
+    clock.now = NOW + 3 * 3600 - 1
+    assert cache.get("key", 240, lambda: 2) == 1
+    clock.now = NOW + 3 * 3600
+    assert cache.get("key", 240, lambda: 2) == 2
+
+
+def test_cache_if_keeps_a_value_out():
+    cache = ResultCache()
+    assert cache.get("key", 240, lambda: (None, False), cache_if=lambda r: r[1]) == (None, False)
+    assert "key" not in cache._entries
+    assert cache.get("key", 240, lambda: ("ok", True), cache_if=lambda r: r[1]) == ("ok", True)
+    assert cache.get("key", 240, lambda: ("again", True)) == ("ok", True)
+
+
+def test_tuple_keys_survive_a_restart(tmp_path):
+    path = str(tmp_path / "scan.json")
+    key = (("BINANCE:A", "BINANCE:B"), ("dbs", ), 240, 300)
+    ResultCache(path=path).set(key, 240, {"BINANCE:A": {"dbs": [1]}})
+
+    cache = ResultCache(path=path)
+    assert cache.get(key, 240, lambda: None) == {"BINANCE:A": {"dbs": [1]}}
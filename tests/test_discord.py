@@ -0,0 +1,82 @@
+import concurrent.futures
+
+import pytest
+
+from discord import MAX_EMBED_CHARS, MAX_EMBEDS, MAX_FIELDS, Discord
+from webhook import WebhookServer
+
+
+def fields(n, value="1.0", width=8):
+    return [{"name": f"plot {i}".ljust(width), "value": value, "inline": True}
+            for i in range(n)]
+
+
+@pytest.fixture
+def webhook():
+    with WebhookServer() as server:
+        yield server
+
+
+@pytest.fixture
+def discord(webhook):
+    client = Discord(webhook.url)
+    yield client
+    client.close()
+
+
+def delivered(futures):
+    return [future.result() for future in concurrent.futures.as_completed(futures, 10)]
+
+
+def test_batches_stay_within_webhook_limits(webhook, discord):
+    data = {f"BINANCE:SYM{i}USDT": {"dbs": fields(6)} for i in range(25)}
+    # One indicator over the field limit, and two too long to share a payload
+    data["BINANCE:WIDE"] = {"dbs": fields(2 * MAX_FIELDS + 1)}
+    for sym in ("BINANCE:LONG1", "BINANCE:LONG2"):
+        data[sym] = {"dbs": fields(6, width=MAX_EMBED_CHARS // 10)}
+
+    assert all(delivered(discord.deliver(data, 240, bar_time=1)))
+    # The stub answers 400 to a payload over a limit
+    assert all(status == 204 for _, status in webhook.requests)
+    assert all(len(payload["embeds"]) <= MAX_EMBEDS for payload in webhook.payloads)
+    embeds = [embed for payload in webhook.payloads for embed in payload["embeds"]]
+    assert sum(len(embed["fields"]) for embed in embeds) == 25 * 6 + 2 * MAX_FIELDS + 1 + 12
+    assert max(len(embed["fields"]) for embed in embeds) == MAX_FIELDS
+    titles = [{embed["title"] for embed in payload["embeds"]} for payload in webhook.payloads]
+    assert not any({"BINANCE:LONG1240 dbs", "BINANCE:LONG2240 dbs"} <= t for t in titles)
+    # 30 embeds, as few payloads as the 10 embed limit and the long ones allow
+    assert len(webhook.payloads) == 4
+
+
+def test_rate_limit_waits_retry_after(webhook, discord):
+    webhook.rate_limit(2, retry_after=0.2)
+
+    assert delivered(discord.deliver({"BINANCE:A": {"dbs": fields(3)}}, 240, bar_time=1)) == [True]
+    times = [t for t, _ in webhook.requests]
+    assert [status for _, status in webhook.requests] == [429, 429, 204]
+    assert times[1] - times[0] >= 0.2 and times[2] - times[1] >= 0.2
+
+
+def test_dropped_payload_is_sent_again(webhook):
+    discord = Discord(webhook.url, retries=2)
+    try:
+        webhook.rate_limit(2, retry_after=0.05)
+        data = {"BINANCE:A": {"dbs": fields(3)}}
+        assert delivered(discord.deliver(data, 240, bar_time=1)) == [False]
+        assert delivered(discord.deliver(data, 240, bar_time=1)) == [True]
+    finally:
+        discord.close()
+
+
+def test_plots_are_sent_once_per_bar(webhook, discord):
+    data = {"BINANCE:A": {"dbs": fields(3)}}
+    assert delivered(discord.deliver(data, 240, bar_time=1)) == [True]
+    # The live bar moves the plots, they were already sent for this bar
+    assert discord.deliver({"BINANCE:A": {"dbs": fields(3, value="2.0")}}, 240, bar_time=1) == []
+    # A new plot of the same bar goes alone
+    assert delivered(discord.deliver({"BINANCE:A": {"dbs": fields(4)}}, 240, bar_time=1)) == [True]
+    assert [field["name"].strip() for field in webhook.payloads[-1]["embeds"][0]["fields"]] == [
+        "plot 3"]
+    # And every plot again on the next bar
+    assert delivered(discord.deliver(data, 240, bar_time=2)) == [True]
+    assert len(webhook.payloads) == 3
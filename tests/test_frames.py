@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from frames import HEARTBEAT, FrameDecoder, batch, encode
+
+
+def frame(payload):
+    """ A frame as the server sends it, its length in UTF-16 code units """
+    return f"~m~{len(payload.encode('utf-16-le')) // 2}~m~{payload}"
+
+
+def packet(m, *params):
+    return json.dumps({"m": m, "p": list(params)}, separators=(",", ":"), ensure_ascii=False)
+
+
+HELLO = '{"session_id":"<0.1.2>_abc","timestamp":1}'
+DU = packet("du", "cs_abc", {"s_0": {"s": [{"i": 0, "v": [1.0, 2.0]}]}})
+# ~m~ inside a payload must not be taken for a frame boundary
+TILDES = packet("symbol_resolved", "cs_abc", "symbol_0", {"description": "A ~m~4~m~ B"})
+# Outside the BMP, one character but two UTF-16 code units
+ASTRAL = packet("symbol_resolved", "cs_abc", "symbol_0", {"description": "\U0001F680 moon"})
+MESSAGE = "".join(frame(p) for p in (HELLO, "~h~7", DU, TILDES, ASTRAL, "~h~8"))
+EXPECTED = [(None, HELLO), (HEARTBEAT, "~h~7"), ("du", DU), ("symbol_resolved", TILDES),
+            ("symbol_resolved", ASTRAL), (HEARTBEAT, "~h~8")]
+
+
+def test_whole_message():
+    assert FrameDecoder().feed(MESSAGE) == EXPECTED
+
+
+@pytest.mark.parametrize("payload", [DU, TILDES, ASTRAL])
+def test_single_frame(payload):
+    assert FrameDecoder().feed(frame(payload)) == [(json.loads(payload)["m"], payload)]
+
+
+def test_message_cut_at_every_offset():
+    for cut in range(len(MESSAGE) + 1):
+        decoder = FrameDecoder()
+        frames = decoder.feed(MESSAGE[:cut]) + decoder.feed(MESSAGE[cut:])
+        assert frames == EXPECTED, cut
+        assert decoder._buffer == ""
+
+
+def test_message_fed_one_character_at_a_time():
+    decoder = FrameDecoder()
+    frames = []
+    for char in MESSAGE:
+        frames.extend(decoder.feed(char))
+    assert frames == EXPECTED
+
+
+def test_reset_drops_a_partial_frame():
+    decoder = FrameDecoder()
+    assert decoder.feed(frame(DU)[:10]) == []
+    decoder.reset()
+    assert decoder.feed(frame(TILDES)) == [("symbol_resolved", TILDES)]
+
+
+def test_malformed_message_raises():
+    with pytest.raises(ValueError):
+        FrameDecoder().feed("garbage~m~3~m~abc")
+
+
+def test_batch_respects_limit():
+    frames = [encode(packet("create_series", "cs_abc", i)) for i in range(100)]
+    messages = batch(frames, limit=500)
+    assert "".join(messages) == "".join(frames)
+    assert all(len(message) <= 500 for message in messages)
+    assert FrameDecoder().feed("".join(messages))[-1][0] == "create_series"
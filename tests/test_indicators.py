@@ -0,0 +1,40 @@
+import math
+
+import pytest
+
+from bars import BarBuffer
+from indicators import RSI
+
+# Wilder's worked RSI example (New Concepts in Technical Trading Systems, also the
+# StockCharts RSI sheet), one close per bar
+CLOSES = [
+    44.34, 44.09, 44.15, 43.61, 44.33, 44.83, 45.10, 45.42, 45.84, 46.08, 45.89, 46.03,
+    45.61, 46.28, 46.28, 46.00, 46.03, 46.41, 46.22, 45.64, 46.21, 46.25, 45.71, 46.45,
+    45.78, 45.35, 44.03, 44.18, 44.22, 44.57, 43.42, 42.66, 43.13
+]
+# STD;RSI (length 14, close) from the 15th bar on: RMA seeded with the SMA of the
+# first 14 changes. The sheet rounds its averages to 2 decimals, these do not
+REFERENCE = [
+    70.4641, 66.2496, 66.4809, 69.3469, 66.2947, 57.9150, 62.8807, 63.2088, 56.0116,
+    62.3399, 54.6710, 50.3868, 40.0194, 41.4926, 41.9024, 45.4995, 37.3228, 33.0905,
+    37.7888
+]
+
+
+def test_rsi_compute_matches_reference():
+    values = RSI().compute(CLOSES)
+    assert all(math.isnan(v) for v in values[:14])
+    assert list(values[14:]) == pytest.approx(REFERENCE, abs=1e-4)
+
+
+def test_rsi_update_matches_reference_on_live_ticks():
+    bars, rsi, live = BarBuffer(300), RSI(), []
+    for i, close in enumerate(CLOSES):
+        # The live bar moves a few times before it closes at close
+        for tick in (close + 0.3, close - 0.2, close):
+            bars.update([i * 60.0, close, close + 0.3, close - 0.2, tick, 1.0])
+            vals = rsi.update(bars)
+        live.append(vals)
+    assert live[14] is None
+    assert [vals[0] for vals in live[15:]] == [i * 60.0 for i in range(15, len(CLOSES))]
+    assert [vals[1] for vals in live[15:]] == pytest.approx(REFERENCE[1:], abs=1e-4)
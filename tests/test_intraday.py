@@ -0,0 +1,18 @@
+import pytest
+
+from intraday import IntradayPriceManager
+
+
+def test_timeframes_too_coarse_for_local_study_raise():
+    ipm = IntradayPriceManager()
+    for timeframes in ([1, "1D"], [15, "W"]):
+        with pytest.raises(Exception, match="rsi needs"):
+            ipm.get(type="chart", syms=["BINANCE:A"], indicators=["rsi"],
+                    timeframes=timeframes, histbars=300, timeout=1)
+    assert not ipm._futures
+
+
+def test_coarse_history_is_capped():
+    timeframe, coarser, histbars = IntradayPriceManager()._coarse_histbars(
+        [240, 15, "1D"], 300, ["rsi"])
+    assert (timeframe, coarser, histbars) == ("15", ["240", "1D"], 5000)
@@ -0,0 +1,43 @@
+import math
+import time
+
+import pytest
+
+from intraday import IntradayPriceManager
+from quotes import QuoteTable
+
+SYMS = ["BINANCE:A", "BINANCE:B", "BINANCE:C"]
+
+
+def test_quote_get_fills_the_table(replay_server):
+    ipm = IntradayPriceManager()
+    ipm._ws_url = replay_server.url
+    started = time.time()
+    ipm.get(type="quote", syms=SYMS, timeout=1)
+
+    quotes = ipm.get_quotes()
+    snapshot = quotes.snapshot()
+    assert sorted(snapshot) == SYMS
+    assert quotes.column("lp").tolist() == [snapshot[sym][0] for sym in SYMS]
+    assert all(lp > 0 and volume >= 0 and time >= int(started)
+               for lp, volume, time in snapshot.values())
+    with pytest.raises(TypeError):
+        quotes.column("lp")[0] = 1.0
+
+
+def test_volume_only_update_is_stamped_on_receipt():
+    ipm = IntradayPriceManager()
+    # As created by get(type="quote")
+    ipm._quotes = QuoteTable(SYMS)
+    ipm._on_quote(["qs_x", {"n": "BINANCE:A", "s": "ok", "v": {"lp": 10.0, "lp_time": 100}}])
+    received = time.time()
+    ipm._on_quote(["qs_x", {"n": "BINANCE:A", "s": "ok", "v": {"volume": 5.0}}])
+
+    lp, volume, stamped = ipm.get_quotes().get("BINANCE:A")
+    assert (lp, volume) == (10.0, 5.0)
+    assert received <= stamped <= time.time()
+    # Errors and symbols outside the table are ignored
+    ipm._on_quote(["qs_x", {"n": "BINANCE:B", "s": "error", "v": {"lp": 1.0}}])
+    ipm._on_quote(["qs_x", {"n": "BINANCE:Z", "s": "ok", "v": {"lp": 1.0}}])
+    assert math.isnan(ipm.get_quotes().get("BINANCE:B")[0])
+    assert sorted(ipm.get_quotes().snapshot()) == ["BINANCE:A"]
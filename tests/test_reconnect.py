@@ -0,0 +1,86 @@
+import threading
+import time
+
+from frames import FrameDecoder, parse
+from intraday import IntradayPriceManager
+from replay import Recorder, ReplayServer, load
+
+SYMS = [f"BINANCE:SYM{i}USDT" for i in range(10)]
+
+
+def sent_histbars(path):
+    """ histbars of every create_series sent, in order """
+    histbars = []
+    for _, direction, message in load(path):
+        if direction == "out":
+            for kind, payload in FrameDecoder().feed(message):
+                if kind == "create_series":
+                    histbars.append(parse(payload).get("p")[5])
+    return histbars
+
+
+def test_stream_resumes_after_server_restart(tmp_path):
+    recording = str(tmp_path / "frames.jsonl")
+    recorder = Recorder(recording)
+    server = ReplayServer(speed=None, tick_interval=0.05).start()
+    ipm = IntradayPriceManager(reconnect=True, backoff=0.1, max_backoff=0.5,
+                               recorder=recorder)
+    ipm._ws_url = server.url
+    received = []
+
+    def consume():
+        for event in ipm.stream(syms=SYMS, indicators=["rsi"], local_indicators=True,
+                                timeframe=1, histbars=100):
+            received.append((time.perf_counter(), event))
+
+    consumer = threading.Thread(target=consume)
+    consumer.daemon = True
+    consumer.start()
+    try:
+        assert ipm.wait(10)
+        bars = {sym: len(ipm.get_bars(sym)) for sym in SYMS}
+        studies = ipm.get_technical_results()
+
+        server.stop()
+        time.sleep(0.5)
+        restarted = time.perf_counter()
+        server.start()
+        deadline = restarted + 10
+        updated = set()
+        while updated != set(SYMS) and time.perf_counter() < deadline:
+            updated = {event.sym for t, event in list(received) if t > restarted}
+            time.sleep(0.05)
+
+        # Every symbol updates again, with its bars and studies kept
+        assert updated == set(SYMS)
+        assert all(len(ipm.get_bars(sym)) >= bars[sym] for sym in SYMS)
+        results = ipm.get_technical_results()
+        assert all(set(results[sym]) >= set(studies[sym]) for sym in SYMS)
+    finally:
+        ipm.close()
+        server.stop()
+        recorder.close()
+
+    # Resubscribed sessions only ask for the bars missed during the outage
+    histbars = sent_histbars(recording)
+    assert histbars[:len(SYMS)] == [100] * len(SYMS)
+    assert len(histbars) >= 2 * len(SYMS)
+    assert max(histbars[len(SYMS):]) <= 2
+
+
+def test_get_subscribes_once_a_late_server_starts():
+    server = ReplayServer(speed=None).start()
+    url = server.url
+    # Nothing listens on the port until the server starts again
+    server.stop()
+    ipm = IntradayPriceManager(reconnect=True, backoff=0.1, max_backoff=0.2)
+    ipm._ws_url = url
+    starter = threading.Timer(0.5, server.start)
+    starter.start()
+    try:
+        ipm.get(type="chart", syms=SYMS[:2], indicators=["dbs"], timeout=6)
+        assert ipm.wait(0)
+        assert sorted(ipm.get_technical_results()) == SYMS[:2]
+    finally:
+        starter.join()
+        server.stop()
@@ -0,0 +1,26 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from resample import Resampler
+from timeframes import TIMEZONE, bar_close_time, bar_open_time
+
+# Tuesday 2024-01-02 03:00 in Singapore, still Monday in UTC
+NOW = datetime(2024, 1, 2, 3, tzinfo=ZoneInfo(TIMEZONE)).timestamp()
+
+
+def test_daily_and_weekly_bars_open_at_chart_timezone_midnight():
+    zone = ZoneInfo(TIMEZONE)
+    assert datetime.fromtimestamp(bar_open_time("1D", NOW), zone) == datetime(
+        2024, 1, 2, tzinfo=zone)
+    assert datetime.fromtimestamp(bar_open_time("W", NOW), zone) == datetime(
+        2024, 1, 1, tzinfo=zone)
+    assert bar_close_time("1D", NOW) == bar_open_time("1D", NOW) + 86400
+
+
+def test_resampled_bars_match_cache_alignment():
+    for timeframe in (60, 240, "1D", "W"):
+        resampler = Resampler(timeframe)
+        resampler.update([NOW, 1.0, 2.0, 0.5, 1.5, 10.0])
+        start = resampler.bars.last()[0]
+        assert start == bar_open_time(timeframe, NOW)
+        assert bar_close_time(timeframe, NOW) > NOW >= start
@@ -0,0 +1,34 @@
+import pytest
+
+import scanner
+from scanner import ScanCoordinator
+
+SYMS = [f"BINANCE:SYM{i}USDT" for i in range(8)]
+
+
+@pytest.mark.parametrize("failure", ["raises", "times out"])
+def test_failed_shard_is_rescanned_and_merged(replay_server, monkeypatch, failure):
+    scan_shard = scanner.scan_shard
+    shards, failed = [], []
+
+    def flaky_scan_shard(syms, *args):
+        shards.append(list(syms))
+        if SYMS[0] in syms and not failed:
+            failed.append(list(syms))
+            if failure == "raises":
+                raise ConnectionError("shard dropped")
+            # A timed out shard returns the studies calculated so far
+            return {syms[0]: scan_shard(syms[:1], *args)[syms[0]]}
+        return scan_shard(syms, *args)
+
+    monkeypatch.setattr(scanner, "scan_shard", flaky_scan_shard)
+    with ScanCoordinator(shards=2, timeout=10, retries=1,
+                         ws_url=replay_server.url) as coordinator:
+        results = coordinator.get_technical_results(SYMS, ["dbs"], timeframe=240,
+                                                    histbars=50)
+
+    assert sorted(results) == SYMS
+    assert all(set(studies) == {"dbs"} for studies in results.values())
+    # The failed shard's missing symbols, and only those, went to a second round
+    missing = failed[0] if failure == "raises" else failed[0][1:]
+    assert sorted(sum(shards[2:], [])) == sorted(missing)
@@ -0,0 +1,43 @@
+import os
+
+from store import BarStore
+
+
+def bar(t):
+    return [t, 1.0, 2.0, 0.5, 1.5, 10.0]
+
+
+def test_append_and_reopen(tmp_path):
+    store = BarStore(str(tmp_path))
+    assert store.append("BINANCE:A", 240, [bar(1.0), bar(2.0)]) == 2
+    # Only bars newer than the last stored one are kept
+    assert store.append("BINANCE:A", 240, [bar(2.0), bar(3.0)]) == 1
+    store.close()
+
+    store = BarStore(str(tmp_path))
+    assert store.count("BINANCE:A", 240) == 3
+    assert store.last("BINANCE:A", 240) == 3.0
+    assert list(store.tail("BINANCE:A", 240, 2)) == [bar(2.0), bar(3.0)]
+    assert store.last("BINANCE:B", 240) == 0
+
+
+def test_index_is_written_once_per_series(tmp_path):
+    store = BarStore(str(tmp_path))
+    for t in range(1, 51):
+        for sym in ("BINANCE:A", "BINANCE:B"):
+            store.append(sym, 240, [bar(float(t))])
+    with open(os.path.join(tmp_path, "index.jsonl")) as f:
+        assert len(f.readlines()) == 2
+    assert store.count("BINANCE:B", 240) == 50
+
+
+def test_torn_index_line_is_ignored(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.append("BINANCE:A", 240, [bar(1.0)])
+    with open(os.path.join(tmp_path, "index.jsonl"), "a") as f:
+        f.write('["BINANCE:B|240", "BIN')
+
+    store = BarStore(str(tmp_path))
+    assert store.count("BINANCE:B", 240) == 0
+    store.append("BINANCE:C", 240, [bar(1.0)])
+    assert BarStore(str(tmp_path)).count("BINANCE:C", 240) == 1
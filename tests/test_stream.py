@@ -0,0 +1,81 @@
+import asyncio
+
+from async_intraday import AsyncIntradayPriceManager
+from stream import AsyncEventQueue
+
+
+def test_close_releases_blocked_put():
+    async def run():
+        events = AsyncEventQueue(maxsize=1, policy="block")
+        await events.put(1)
+        producer = asyncio.ensure_future(events.put(2))
+        await asyncio.sleep(0)
+        events.close()
+        await asyncio.wait_for(producer, 1)
+        return await events.get(), await events.get()
+
+    # Only the blocked event is dropped, the queued one is still read
+    assert asyncio.run(run()) == (1, None)
+
+
+def test_close_keeps_queued_events():
+    async def run():
+        events = AsyncEventQueue(maxsize=2)
+        for event in range(3):
+            await events.put(event)
+        events.close()
+        await events.put(3)
+        return [await events.get() for _ in range(3)], events.dropped
+
+    assert asyncio.run(run()) == ([1, 2, None], 1)
+
+
+def test_closed_block_stream_keeps_shared_connection(replay_server):
+    async def run():
+        async with AsyncIntradayPriceManager(connections=1) as ipm:
+            ipm._ws_url = replay_server.url
+            stream = ipm.stream(maxsize=1, policy="block", syms=["BINANCE:A"],
+                                indicators=["dbs"])
+            await stream.__anext__()
+            # Lets the reader block on the full queue
+            await asyncio.sleep(0.2)
+            await stream.aclose()
+            return await ipm.get("chart", syms=["BINANCE:B"], indicators=["dbs"], timeout=5)
+
+    assert list(asyncio.run(run())) == ["BINANCE:B"]
+
+
+def test_unread_block_stream_does_not_hold_back_other_requests(replay_server):
+    async def run():
+        async with AsyncIntradayPriceManager(connections=1) as ipm:
+            ipm._ws_url = replay_server.url
+            stream = ipm.stream(maxsize=1, policy="block", syms=["BINANCE:A"],
+                                indicators=["dbs"])
+            await stream.__anext__()
+            # Lets the stream's reader fill the queue
+            await asyncio.sleep(0.2)
+            try:
+                # The stream is never read again while the get runs
+                return await asyncio.wait_for(ipm.get(
+                    "chart", syms=["BINANCE:B"], indicators=["dbs"], timeout=5), 3)
+            finally:
+                await stream.aclose()
+
+    assert list(asyncio.run(run())) == ["BINANCE:B"]
+
+
+def test_unread_drop_oldest_stream_shares_the_connection(replay_server):
+    async def run():
+        async with AsyncIntradayPriceManager(connections=1) as ipm:
+            ipm._ws_url = replay_server.url
+            stream = ipm.stream(maxsize=1, syms=["BINANCE:A"], indicators=["dbs"])
+            await stream.__anext__()
+            try:
+                results = await asyncio.wait_for(ipm.get(
+                    "chart", syms=["BINANCE:B"], indicators=["dbs"], timeout=5), 3)
+                return results, len(ipm._connections)
+            finally:
+                await stream.aclose()
+
+    results, connections = asyncio.run(run())
+    assert list(results) == ["BINANCE:B"] and connections == 1
@@ -0,0 +1,44 @@
+"""
+Chart timeframes: their length and how their bars align. Bars open at multiples of the
+timeframe in the chart timezone, days at its midnight and weeks on its Monday, so a bar
+of a timeframe means the same thing to the chart sessions, the resampler and the cache.
+"""
+
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+_UNITS = {"D": 1440, "W": 10080}
+# Epoch day 0 is a Thursday, weekly bars open on Monday
+_MONDAY = 4 * 86400
+
+# Timezone of every chart session, bars are aligned to it everywhere
+TIMEZONE = "Asia/Singapore"
+
+
+def timeframe_minutes(timeframe) -> int:
+    """ Minutes of a timeframe in minutes (240, "240") or TradingView units ("1D", "W") """
+    timeframe = str(timeframe)
+    if timeframe.isdigit():
+        return int(timeframe)
+    return int(timeframe[:-1] or 1) * _UNITS[timeframe[-1]]
+
+
+def bar_open_time(timeframe, now=None, timezone: str = TIMEZONE) -> float:
+    """
+    Epoch seconds at which the bar holding now opened. timeframe is in minutes (240,
+    "240") or TradingView resolution units ("1D", "W"); bars open at multiples of the
+    timeframe in timezone, days at its midnight and weeks on its Monday.
+    """
+    now = time.time() if now is None else now
+    timeframe = str(timeframe)
+    seconds = timeframe_minutes(timeframe) * 60
+    anchor = _MONDAY if timeframe.endswith("W") else 0
+    offset = datetime.fromtimestamp(now, ZoneInfo(timezone)).utcoffset().total_seconds()
+    local = now + offset
+    return local - (local - anchor) % seconds - offset
+
+
+def bar_close_time(timeframe, now=None, timezone: str = TIMEZONE) -> float:
+    """ Epoch seconds at which the bar open at now closes, see bar_open_time """
+    return bar_open_time(timeframe, now, timezone) + timeframe_minutes(timeframe) * 60
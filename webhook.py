@@ -0,0 +1,99 @@
+"""
+WebhookServer is a local stand-in for a Discord webhook. It accepts the payloads
+Discord.deliver posts, rejects those over the embed limits with a 400 like Discord does,
+and can answer the next requests with a 429 and a retry_after, so batching, rate limits
+and dedupe are tested without posting anywhere.
+
+    with WebhookServer() as server:
+        server.rate_limit(1, retry_after=0.2)
+        discord = Discord(server.url)
+        discord.deliver(data, 240)
+        print(server.payloads)
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from discord import MAX_EMBED_CHARS, MAX_EMBEDS, MAX_FIELDS, Discord
+
+
+class WebhookServer():
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._host = host
+        self._port = port
+        self._httpd = None
+        self._t = None
+        self._lock = threading.Lock()
+        # retry_after of the next rate limited requests, oldest first
+        self._limits = []
+        # Payloads accepted, and (epoch seconds, status) of every request
+        self.payloads = []
+        self.requests = []
+        self.url = None
+
+    def rate_limit(self, times: int = 1, retry_after: float = 0.1):
+        """ Answers the next times requests with a 429 asking to retry after retry_after seconds """
+        with self._lock:
+            self._limits.extend([retry_after] * times)
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                status, body = server._handle(json.loads(self.rfile.read(length)))
+                self.send_response(status)
+                if body is not None:
+                    data = json.dumps(body).encode()
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                else:
+                    self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((self._host, self._port), Handler)
+        self._port = self._httpd.server_address[1]
+        self.url = f"http://{self._host}:{self._port}/webhook"
+        self._t = threading.Thread(target=self._httpd.serve_forever)
+        self._t.daemon = True
+        self._t.start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._t.join()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handle(self, payload):
+        """ (status, JSON body or None) of one webhook call """
+        with self._lock:
+            if self._limits:
+                retry_after = self._limits.pop(0)
+                self.requests.append((time.time(), 429))
+                return 429, {"message": "You are being rate limited.",
+                             "retry_after": retry_after, "global": False}
+            embeds = payload.get("embeds", [])
+            if len(embeds) > MAX_EMBEDS or any(
+                    len(embed["fields"]) > MAX_FIELDS for embed in embeds) or sum(
+                    Discord._embed_chars(embed) for embed in embeds) > MAX_EMBED_CHARS:
+                self.requests.append((time.time(), 400))
+                return 400, {"message": "Invalid Form Body"}
+            self.requests.append((time.time(), 204))
+            self.payloads.append(payload)
+            return 204, None
+